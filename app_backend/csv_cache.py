@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+class CSVCache:
+    """
+    On-disk cache of parsed CSV files. Every column is stored as a separate `.npy` file,
+    numerical columns are loaded back as read-only memory maps instead of being parsed again.
+
+    The cache keeps one entry per file: storing a new version of a file removes the older ones.
+    When the entries take more than `max_size` bytes, the least recently used ones are removed.
+    """
+
+    # Bump when the on-disk layout changes, old entries are then simply ignored
+    FORMAT_VERSION = 1
+    # Default size limit of the cache in bytes
+    DEFAULT_MAX_SIZE = 5 * 2 ** 30
+
+    def __init__(self, cache_dir: str = None, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser('~'), '.pca_analysis_cache')
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    # Build the cache key of a file
+    def key(self, filename: str, sep: str, header: int) -> str:
+        """
+        Builds the cache key of a file from its path, size, modification time and parser settings.
+
+        Args:
+            filename (str): Name of the CSV file.
+            sep (str): Delimiter used in the CSV file.
+            header (int): Row number used as the column names.
+
+        Returns:
+            str: Cache key.
+        """
+        stat = os.stat(filename)
+        identity = f"{self.FORMAT_VERSION}|{os.path.abspath(filename)}|{stat.st_size}|{stat.st_mtime_ns}|{sep}|{header}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    # Identify the file regardless of its version
+    @staticmethod
+    def source(filename: str, sep: str, header: int) -> str:
+        return f"{os.path.abspath(filename)}|{sep}|{header}"
+
+    # Load a cached DataFrame
+    def load(self, filename: str, sep: str, header: int):
+        """
+        Loads the parsed DataFrame of a file if it is present in the cache.
+
+        Args:
+            filename (str): Name of the CSV file.
+            sep (str): Delimiter used in the CSV file.
+            header (int): Row number used as the column names.
+
+        Returns:
+            pd.DataFrame: Cached DataFrame or None if the file is not cached.
+        """
+        entry_dir = os.path.join(self.cache_dir, self.key(filename, sep, header))
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+
+            data = {}
+            for i, column in enumerate(meta['columns']):
+                path = os.path.join(entry_dir, f'col_{i}.npy')
+                if column['mmap']:
+                    data[i] = np.load(path, mmap_mode='r')
+                else:
+                    data[i] = pd.Series(np.load(path, allow_pickle=True)).astype(column['dtype'])
+
+            df = pd.DataFrame(data, copy=False)
+            df.columns = [column['name'] for column in meta['columns']]
+            self._touch(entry_dir)
+            return df
+        except Exception:
+            # A damaged entry is treated as a cache miss
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+    # Iterate over a cached DataFrame in batches of rows
+    def iter_batches(self, filename: str, sep: str, header: int, batch_size: int):
+        """
+        Returns an iterator over batches of rows of a cached file. Numerical columns are read from
+        memory maps, so only the current batch of them is held in memory.
+
+        Args:
+            filename (str): Name of the CSV file.
+            sep (str): Delimiter used in the CSV file.
+            header (int): Row number used as the column names.
+            batch_size (int): Number of rows per batch.
+
+        Returns:
+            iterator: Iterator over DataFrames, or None if the file is not cached.
+        """
+        entry_dir = os.path.join(self.cache_dir, self.key(filename, sep, header))
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path, 'r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+        arrays = []
+        for i, column in enumerate(meta['columns']):
+            path = os.path.join(entry_dir, f'col_{i}.npy')
+            if column['mmap']:
+                arrays.append(np.load(path, mmap_mode='r'))
+            else:
+                arrays.append(pd.Series(np.load(path, allow_pickle=True)).astype(column['dtype']))
+        names = [column['name'] for column in meta['columns']]
+        n_rows = len(arrays[0]) if arrays else 0
+        self._touch(entry_dir)
+
+        def batches():
+            for start in range(0, n_rows, batch_size):
+                data = {i: np.asarray(array[start:start + batch_size]) if isinstance(array, np.ndarray)
+                        else array.iloc[start:start + batch_size].reset_index(drop=True)
+                        for i, array in enumerate(arrays)}
+                batch = pd.DataFrame(data)
+                batch.columns = names
+                yield batch
+
+        return batches()
+
+    # Store a parsed DataFrame
+    def store(self, df: pd.DataFrame, filename: str, sep: str, header: int) -> None:
+        """
+        Stores the parsed DataFrame of a file in the cache, then removes stale and least recently used entries.
+
+        Args:
+            df (pd.DataFrame): Parsed data.
+            filename (str): Name of the CSV file.
+            sep (str): Delimiter used in the CSV file.
+            header (int): Row number used as the column names.
+        """
+        # Numerical columns are stored as they are in memory, a frame larger than the whole cache is not written
+        if df.memory_usage(index=False).sum() > self.max_size:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_dir = os.path.join(self.cache_dir, self.key(filename, sep, header))
+
+        # Write into a temporary directory first, so a half-written entry is never visible
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        try:
+            columns = []
+            for i in range(df.shape[1]):
+                column = df.iloc[:, i]
+                mmap = isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biuf'
+                if mmap:
+                    np.save(os.path.join(tmp_dir, f'col_{i}.npy'), column.to_numpy())
+                else:
+                    np.save(os.path.join(tmp_dir, f'col_{i}.npy'), column.to_numpy(dtype=object), allow_pickle=True)
+                columns.append({'name': str(df.columns[i]), 'dtype': str(column.dtype), 'mmap': mmap})
+
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as meta_file:
+                json.dump({'columns': columns, 'source': self.source(filename, sep, header)}, meta_file)
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self._evict(entry_dir, self.source(filename, sep, header))
+
+    # Remove stale and least recently used entries
+    def _evict(self, entry_dir: str, source: str) -> None:
+        """
+        Removes the older entries of the same file, then the least recently used entries until the cache
+        fits in `max_size`. An entry larger than `max_size` on its own is not kept either.
+
+        Args:
+            entry_dir (str): Directory of the entry just stored.
+            source (str): Identity of the stored file (see `source`).
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            # Only finished entries (named by their key), temporary directories of other writers are skipped
+            if not os.path.isdir(path) or len(name) != 40:
+                continue
+            if path != entry_dir and self._entry_source(path) == source:
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((os.path.getmtime(path), self._entry_size(path), path))
+
+        total = sum(size for _, size, _ in entries)
+        # The stored entry is removed last, only if it does not fit on its own
+        for _, size, path in sorted(entries, key=lambda entry: (entry[2] == entry_dir, entry[0])):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    # Mark an entry as used
+    @staticmethod
+    def _touch(entry_dir: str) -> None:
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _entry_source(entry_dir: str):
+        try:
+            with open(os.path.join(entry_dir, 'meta.json'), 'r', encoding='utf-8') as meta_file:
+                return json.load(meta_file).get('source')
+        except Exception:
+            return None
+
+    @staticmethod
+    def _entry_size(entry_dir: str) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+
+    # Remove all cached files
+    def clear(self) -> None:
+        """
+        Removes all entries from the cache.
+        """
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
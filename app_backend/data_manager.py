@@ -1,7 +1,31 @@
+import glob
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
-from sklearn.decomposition import PCA
+import scipy.sparse as sp
+from sklearn.decomposition import IncrementalPCA
+from sklearn.kernel_approximation import Nystroem
+from sklearn.metrics import pairwise_distances
 
+from .csv_cache import CSVCache
+from .history import DataHistory
 from .pca_handler import PCAHandler
+from .pca_solver import PCASolver
+from .preprocessing import Pipeline, Preprocessor, convert_variable_type, translate_variable_type
+from .stability import StabilityAnalysis
+from .transform_plan import TransformPlan
+from .type_inference import TypeInference
+
+
+# Read one shard of a multi-file dataset (runs in a worker process)
+def _read_shard(filename: str, sep: str, header: int) -> pd.DataFrame:
+    df = pd.read_csv(filename, sep=sep, header=header)
+    df.columns = df.columns.astype(str)
+    return df
 
 
 class DataManager:
@@ -9,18 +33,52 @@ class DataManager:
     Object responsible for data preprocessing and editing.
     """
 
+    PRECISIONS = ('float64', 'float32')
+
     def __init__(self) -> None:
         self.input_df = None
         self.df = None
 
-        # DataFrame in the last saved state
-        self.df_last = None
+        # Saved states for undo/redo
+        self.history = DataHistory()
+
+        # Sparse one-hot encoded variables, rows aligned with the DataFrame
+        self.sparse_block = None
+        self.sparse_columns = []
+
+        # Executed operations with their fitted parameters, applied again to new data by PCAHandler.transform
+        self.pipeline = None
+
+        # Lazy mode: operations are recorded in a plan and executed together when the data is needed
+        self.lazy = False
+        self.plan = None
         self.last_file_path = None  # Dodanie atrybutu do przechowywania ścieżki do ostatniego pliku
+        # Parser settings of the last CSV file, used to stream it again (out-of-core PCA)
+        self.source = None
+
+        # On-disk cache of parsed CSV files
+        self.csv_cache = CSVCache()
+
+        # Variable types, computed once per column change
+        self.type_inference = TypeInference()
+        self._type_cache = {}
+        self._suggested_type_cache = {}
+
+        # Covariance eigendecomposition of the last PCA, reused while the data does not change
+        self._data_version = 0
+        self._decomposition = None
+
+        # Floating point precision of normalization, indicators, PCA and clustering (see `set_precision`)
+        self.precision = 'float64'
+        self.dtype = np.float64
 
     # Main Functions
 
     # Read from CSV file
-    def read_from_csv(self, filename: str, sep: str = ';', header: int = 0) -> None:
+    def read_from_csv(self, filename: str, sep: str = ';', header: int = 0, chunksize: int = None,
+                      progress_callback=None, use_cache: bool = False, compact: bool = False,
+                      usecols=None, rows: tuple = None, sample_fraction: float = None,
+                      random_state: int = None) -> None:
         """
         Reads data from a CSV file.
 
@@ -28,46 +86,280 @@ class DataManager:
             filename (str): Name of the CSV file.
             sep (str, optional): Delimiter used in the CSV file. Defaults to ';'.
             header (int, optional): Row number to use as the column names. Defaults to 0.
+            chunksize (int, optional): If given, the file is streamed in chunks of this many rows
+                instead of being parsed in one go. Defaults to None.
+            progress_callback (callable, optional): Called with the fraction of the file read so far
+                (0.0 - 1.0) after every chunk. Only used in streaming mode. Defaults to None.
+            use_cache (bool, optional): Reuse the parsed copy of an unchanged file from the on-disk cache
+                and store newly parsed files in it. Defaults to False.
+            compact (bool, optional): Downcast numerical variables to the smallest type that holds their values
+                and store text variables with few distinct values as `category`. Defaults to False.
+            usecols (list | range | slice, optional): Variables to import, given as names and/or positions,
+                or a range/slice of positions. Other columns are skipped by the parser. Defaults to None (all).
+            rows (tuple, optional): Range of cases to import, `(start, stop)` with 0-based case numbers,
+                `stop` excluded or None for the end of the file. Defaults to None (all).
+            sample_fraction (float, optional): Import only a random fraction (0.0 - 1.0) of the cases
+                (from the `rows` range, if given). Defaults to None (all).
+            random_state (int, optional): Seed of the case sampling. Defaults to None.
+
+        Variable and case selection is passed to the parser, unused data is never parsed.
+        The cache is not used when a selection is given.
         """
         try:
             self.last_file_path = filename  # Aktualizacja ścieżki do ostatnio wczytanego pliku
-            self.input_df = pd.read_csv(filename, sep=sep, header=header)
-            self.input_df.columns = self.input_df.columns.astype(str)
-            self.df = self.input_df.copy()
-            self.df_last = self.input_df.copy()
+
+            selection = usecols is not None or rows is not None or sample_fraction is not None
+            if selection:
+                use_cache = False
+                usecols = self._resolve_usecols(filename, sep, header, usecols)
+            skiprows, nrows = self._row_selection(0 if header is None else header + 1, rows,
+                                                  sample_fraction, random_state)
+
+            source = {'filename': filename, 'sep': sep, 'header': header, 'usecols': usecols}
+
+            if use_cache:
+                cached_df = self.csv_cache.load(filename, sep, header)
+                if cached_df is not None:
+                    self.source = source
+                    self._set_input_df(self._compact_dtypes(cached_df) if compact else cached_df)
+                    if progress_callback is not None:
+                        progress_callback(1.0)
+                    return
+
+            if chunksize is None:
+                input_df = pd.read_csv(filename, sep=sep, header=header, usecols=usecols,
+                                       skiprows=skiprows, nrows=nrows)
+            else:
+                input_df = self._read_csv_chunked(filename, sep, header, chunksize, progress_callback,
+                                                  usecols=usecols, skiprows=skiprows, nrows=nrows)
+            input_df.columns = input_df.columns.astype(str)
+
+            if use_cache:
+                self.csv_cache.store(input_df, filename, sep, header)
+
+            self.source = source
+            self._set_input_df(self._compact_dtypes(input_df) if compact else input_df)
         except FileNotFoundError:
             raise FileNotFoundError("Specified file not found.")
         except Exception as e:
             raise Exception(f"An error occurred while reading the file: {str(e)}")
 
+    # Read all CSV files from a directory
+    def read_from_directory(self, path: str, sep: str = ';', header: int = 0, max_workers: int = None,
+                            progress_callback=None) -> None:
+        """
+        Reads a dataset split into many CSV files with the same columns (shards).
+        The files are parsed in parallel in a process pool, checked against each other
+        and joined into a single DataFrame in file name order.
+
+        Args:
+            path (str): Directory containing the CSV files or a glob pattern, ex. 'data/2024-*.csv'.
+            sep (str, optional): Delimiter used in the CSV files. Defaults to ';'.
+            header (int, optional): Row number to use as the column names. Defaults to 0.
+            max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            progress_callback (callable, optional): Called with the fraction of files read so far (0.0 - 1.0).
+        """
+        try:
+            pattern = os.path.join(path, '*.csv') if os.path.isdir(path) else path
+            filenames = sorted(glob.glob(pattern))
+            if not filenames:
+                raise FileNotFoundError("No CSV files found.")
+
+            shards = [None] * len(filenames)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_read_shard, filename, sep, header): i
+                           for i, filename in enumerate(filenames)}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    shards[futures[future]] = future.result()
+                    if progress_callback is not None:
+                        progress_callback(done / len(filenames))
+
+            self._check_shard_schemas(shards, filenames)
+
+            input_df = pd.concat(shards, ignore_index=True)
+            shards = None
+            self.last_file_path = path
+            self.source = None
+            self._set_input_df(input_df)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(str(e) if str(e) else "Specified file not found.")
+        except Exception as e:
+            raise Exception(f"An error occurred while reading the files: {str(e)}")
+
     # Get DataFrame
     def get_df(self) -> pd.DataFrame:
         """
-        Returns the DataFrame.
+        Returns the DataFrame. In lazy mode, recorded operations are executed first.
         """
+        self.execute_plan()
         return self.df
 
+    # Export DataFrame to a CSV file
+    def export_csv(self, filename: str, sep: str = ';') -> None:
+        """
+        Writes the DataFrame to a CSV file. In lazy mode, recorded operations are executed first.
+        Variables stored in the sparse block are not exported.
+
+        Args:
+            filename (str): Name of the CSV file.
+            sep (str, optional): Delimiter used in the CSV file. Defaults to ';'.
+        """
+        try:
+            self.get_df().to_csv(filename, sep=sep, index=False)
+        except Exception as e:
+            raise Exception(f"An error occurred while exporting the data: {str(e)}")
+
+    # Switch lazy mode
+    def set_lazy(self, lazy: bool) -> None:
+        """
+        Switches lazy mode. In lazy mode, deleting, renaming, type changes, normalization, one-hot encoding
+        and NaN removal are only recorded; they are executed in a single pass when the data is needed
+        (`get_df`, `PCA`, export). Switching lazy mode off executes the recorded operations.
+
+        Args:
+            lazy (bool): True to record operations, False to execute them immediately.
+        """
+        if not lazy:
+            self.execute_plan()
+        self.lazy = lazy
+
+    # Drop the recorded operations
+    def discard_plan(self) -> None:
+        """
+        Drops the operations recorded in lazy mode without executing them, the data stays as it was
+        before they were recorded. Use it when executing the plan fails (e.g. a type change of a variable
+        whose values cannot be converted), as the failed plan is kept until it is executed or discarded.
+        """
+        self.plan = None
+
+    # Set the floating point precision
+    def set_precision(self, precision: str) -> None:
+        """
+        Sets the floating point precision of the computations. In 'float32' mode normalized variables,
+        one-hot indicators, the design matrix, the PCA scores and the distances computed by clustering
+        are stored in single precision, which halves their memory and memory traffic.
+        Use `check_precision` to see the numeric deviation from 'float64' on the current data.
+
+        Args:
+            precision (str): 'float64' or 'float32'.
+        """
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Available precisions: {', '.join(self.PRECISIONS)}.")
+        self.precision = precision
+        self.dtype = np.dtype(precision).type
+
+    # Compare single and double precision on a sample
+    def check_precision(self, n_components: int = 2, sample_size: int = 2000, random_state: int = 0) -> dict:
+        """
+        Runs PCA on a sample of rows of the current data in both precisions and reports the deviation
+        of the 'float32' results from the 'float64' ones. All deviations are relative to the scale
+        of the 'float64' values.
+
+        Args:
+            n_components (int, optional): Number of principal components to compare. Defaults to 2.
+            sample_size (int, optional): Number of sampled rows. Defaults to 2000.
+            random_state (int, optional): Seed of the row sample. Defaults to 0.
+
+        Returns:
+            dict: Maximum deviations of the design matrix ('design_matrix', 0 if it was prepared
+            in 'float32' mode), explained variance ratios ('explained_variance', absolute), components
+            ('components', 1 - |cosine| of the matching components), scores ('scores') and distances
+            between the sampled rows ('distances').
+        """
+        try:
+            self.execute_plan()
+            n_rows = len(self.df)
+            rng = np.random.default_rng(random_state)
+            rows = np.sort(rng.choice(n_rows, size=min(sample_size, n_rows), replace=False))
+            dense = self.df.iloc[rows].to_numpy(dtype=np.float64)
+            block = None
+            if self.sparse_block is not None and self.sparse_block.shape[1] > 0:
+                block = self.sparse_block.tocsr()[rows].astype(np.float64)
+
+            results = {}
+            for dtype in (np.float64, np.float32):
+                solver = PCASolver(svd_solver='full', dtype=dtype)
+                scores = solver.fit(dense, block, n_components)
+                results[dtype] = (solver, scores)
+            solver64, scores64 = results[np.float64]
+            solver32, scores32 = results[np.float32]
+
+            # Components are compared up to their sign
+            cosines = np.abs(np.sum(solver64.components * solver32.components.astype(np.float64), axis=1))
+            signs = np.sign(np.sum(solver64.components * solver32.components, axis=1))
+            scores32 = scores32.astype(np.float64) * signs
+            distance_rows = slice(0, 1000)  # a quadratic number of distances, a part of the sample is enough
+            distances64 = pairwise_distances(scores64[distance_rows])
+            distances32 = pairwise_distances(scores32[distance_rows].astype(np.float32)).astype(np.float64)
+
+            def relative(deviation, reference):
+                scale = np.max(np.abs(reference)) if reference.size else 0.0
+                return float(np.max(np.abs(deviation)) / scale) if scale > 0 else 0.0
+
+            return {
+                'design_matrix': relative(dense.astype(np.float32).astype(np.float64) - dense, dense),
+                'explained_variance': float(np.max(np.abs(solver64.explained_variance - solver32.explained_variance))),
+                'components': float(np.max(1.0 - cosines)),
+                'scores': relative(scores32 - scores64, scores64),
+                'distances': relative(distances32 - distances64, distances64),
+            }
+        except Exception as e:
+            raise Exception(f"An error occurred while checking the precision: {str(e)}")
+
     # Reset to initial state
     def reset(self) -> None:
         """
         Resets DataFrame to the initial state.
         """
-        self.df = self.input_df.copy()
-        self.df_last = self.input_df.copy()
+        self._restore_state(*self.history.reset())
 
     # Undo to the last saved state
     def undo(self) -> None:
         """
-        Reverts DataFrame to the last saved state.
+        Reverts DataFrame to the last saved state. Can be called repeatedly to go further back.
+        """
+        self._restore_state(*self.history.undo(self.df, self._state_extras()))
+
+    # Redo the last undone change
+    def redo(self) -> None:
+        """
+        Brings back the state reverted by the last `undo`.
         """
-        self.df = self.df_last.copy()
+        self._restore_state(*self.history.redo(self.df, self._state_extras()))
 
-    # Save the current state to df_last variable
-    def save(self) -> None:
+    # Save the current state in the history
+    def save(self, description: str = None) -> None:
         """
         Saves the current state of DataFrame.
+        Only references to the columns are stored, unchanged columns are shared between saved states.
+
+        Args:
+            description (str, optional): Description of the operation that follows. Defaults to None.
+        """
+        self.history.push(self.df, description, self._state_extras())
+
+    # Memory used by each variable
+    def memory_report(self) -> pd.DataFrame:
         """
-        self.df_last = self.df.copy()
+        Reports the type and memory usage of every variable.
+
+        Returns:
+            pd.DataFrame: DataFrame indexed by variable name with columns `dtype` and `memory_bytes`.
+            The sparse one-hot block, if present, is reported as a single row.
+        """
+        try:
+            self.execute_plan()
+            report = pd.DataFrame({
+                'dtype': self.df.dtypes.astype(str),
+                'memory_bytes': self.df.memory_usage(deep=True, index=False),
+            })
+            if self.sparse_block is not None:
+                block = self.sparse_block
+                report.loc['(sparse block)'] = [f'sparse {block.dtype}',
+                                                block.data.nbytes + block.indices.nbytes + block.indptr.nbytes]
+            return report
+        except Exception as e:
+            raise Exception(f"An error occurred while preparing the memory report: {str(e)}")
 
     # Remove rows containing NaN values
     def remove_nan_rows(self) -> None:
@@ -75,7 +367,15 @@ class DataManager:
         Removes rows containing NaN values from the DataFrame.
         """
         try:
+            if self._plan_accepts([]):
+                self.plan.remove_nan()
+                return
+            if self.sparse_block is not None:
+                mask = self.df.notna().all(axis=1).to_numpy()
+                self.sparse_block = self.sparse_block[mask]
+            self.pipeline = self.pipeline.add('remove_nan', self.df.columns.tolist())
             self.df.dropna(inplace=True)
+            self._invalidate_caches()
         except Exception as e:
             raise Exception(f"An error occurred while removing NaN rows: {str(e)}")
 
@@ -90,7 +390,18 @@ class DataManager:
             name: Name of the variable to delete.
         """
         try:
+            if self._plan_accepts([name]):
+                self.plan.delete(name)
+                return
+            if name not in self.df.columns and name in self.sparse_columns:
+                keep = [i for i, column in enumerate(self.sparse_columns) if column != name]
+                self.sparse_block = self.sparse_block.tocsc()[:, keep].tocsr()
+                self.sparse_columns = [self.sparse_columns[i] for i in keep]
+                self.pipeline = self.pipeline.add('delete', [name])
+                return
             self.df.drop(columns=[name], inplace=True)
+            self.pipeline = self.pipeline.add('delete', [name])
+            self._invalidate_caches([name])
         except KeyError:
             raise KeyError(f"Variable '{name}' not found in DataFrame.")
         except Exception as e:
@@ -106,7 +417,16 @@ class DataManager:
             new_name (str): New name of the variable.
         """
         try:
+            if self._plan_accepts([old_name]):
+                self.plan.rename(old_name, new_name)
+                return
+            if old_name not in self.df.columns and old_name in self.sparse_columns:
+                self.sparse_columns = [new_name if column == old_name else column for column in self.sparse_columns]
+                self.pipeline = self.pipeline.add('rename', {old_name: new_name})
+                return
             self.df.rename(columns={old_name: new_name}, inplace=True)
+            self.pipeline = self.pipeline.add('rename', {old_name: new_name})
+            self._invalidate_caches([old_name, new_name])
         except KeyError:
             raise KeyError(f"Variable '{old_name}' not found in DataFrame.")
         except Exception as e:
@@ -124,13 +444,30 @@ class DataManager:
             str: Type of the variable.
         """
         try:
-            variable_type = self.df[name].dtype
-            return self._translate_variable_type(variable_type)
+            if self.plan is not None and self.plan.has_column(name):
+                return self.plan.variable_type(name)
+            self.execute_plan()
+            if name not in self.df.columns and name in self.sparse_columns:
+                return 'numerical'
+            if name not in self._type_cache:
+                self._type_cache[name] = self._translate_variable_type(self.df[name].dtype)
+            return self._type_cache[name]
         except KeyError:
             raise KeyError(f"Variable '{name}' not found in DataFrame.")
         except Exception as e:
             raise Exception(f"An error occurred while getting variable type: {str(e)}")
 
+    # Get names of all variables
+    def get_variable_names(self) -> list:
+        """
+        Gets names of all variables, including the sparse one-hot encoded ones.
+
+        Returns:
+            list: Names of the DataFrame columns followed by names of the sparse columns.
+        """
+        self.execute_plan()
+        return self.df.columns.tolist() + list(self.sparse_columns)
+
     # Get types of variables
     def get_variable_types(self) -> dict:
         """
@@ -140,9 +477,12 @@ class DataManager:
             dict: Dictionary containing the data types of variables `name`: `type`.
         """
         try:
+            if self.plan is not None and not self.plan.encoded:
+                return self.plan.variable_types()
+            self.execute_plan()
             v_types = dict()
             for variable in self.df.columns:
-                v_types[variable] = self._translate_variable_type(self.df[variable].dtype)
+                v_types[variable] = self.get_variable_type(variable)
             return v_types
         except Exception as e:
             raise Exception(f"An error occurred while getting variable types: {str(e)}")
@@ -160,24 +500,66 @@ class DataManager:
             name (str): Name of the variable.
         """
         try:
-            current_type = self.df[name].dtype.name
-            translated_type = self._translate_variable_type(current_type)
-
-            if translated_type == 'categorical':
-                # Convert comma-separated decimal numbers to float
-                try:
-                    self.df[name] = self.df[name].astype(str).str.replace(',', '.').astype(float)
-                except ValueError:
-                    raise ValueError(f"Cannot convert column '{name}' to numeric. Ensure that all values, including comma-separated decimals, are convertible to float.")
-                
-            else:
-                # Convert numerical to categorical
-                self.df[name] = self.df[name].astype('object')
+            if self._plan_accepts([name]):
+                self.plan.change_type(name)
+                return
+            self.df[name] = self._converted_variable_type(self.df[name], name)
+            self.pipeline = self.pipeline.add('change_type', [name])
+            self._invalidate_caches([name])
         except KeyError:
             raise KeyError(f"Variable '{name}' not found in DataFrame.")
         except Exception as e:
             raise Exception(f"An error occurred while changing variable type: {str(e)}")
 
+    # Suggest better types for the variables
+    def suggest_variable_types(self) -> dict:
+        """
+        Suggests types of the variables based on a sample of their values (see `TypeInference`):
+        decimal numbers with a comma stored as text, integer-coded categories and dates.
+        Suggestions are cached and recomputed only for variables changed since the last call.
+
+        Returns:
+            dict: Dictionary `name`: `suggested type` of the variables whose type should be changed.
+        """
+        try:
+            self.execute_plan()
+            suggestions = dict()
+            for variable in self.df.columns:
+                if variable not in self._suggested_type_cache:
+                    self._suggested_type_cache[variable] = self.type_inference.suggest(
+                        self.df[variable], self.get_variable_type(variable))
+                if self._suggested_type_cache[variable] is not None:
+                    suggestions[variable] = self._suggested_type_cache[variable]
+            return suggestions
+        except Exception as e:
+            raise Exception(f"An error occurred while suggesting variable types: {str(e)}")
+
+    # Change the types of all variables to the suggested ones
+    def apply_suggested_types(self, suggestions: dict = None) -> None:
+        """
+        Converts variables to the suggested types in one go.
+        Dates are converted to numbers of days since 1970-01-01.
+
+        Args:
+            suggestions (dict, optional): Dictionary `name`: `type` of the conversions to apply.
+                Defaults to all suggestions returned by `suggest_variable_types`.
+        """
+        try:
+            if suggestions is None:
+                suggestions = self.suggest_variable_types()
+            else:
+                self.execute_plan()
+            if not suggestions:
+                return
+            for name, variable_type in suggestions.items():
+                self.df[name] = self.type_inference.convert(self.df[name], variable_type)
+            self.pipeline = self.pipeline.add('convert', dict(suggestions))
+            self._invalidate_caches(list(suggestions))
+        except KeyError as e:
+            raise KeyError(f"Variable {str(e)} not found in DataFrame.")
+        except Exception as e:
+            raise Exception(f"An error occurred while applying suggested types: {str(e)}")
+
     # Standardize a variable
     def normalize_std(self, variable_name: str) -> None:
         """
@@ -187,9 +569,10 @@ class DataManager:
             variable_name (str): Name of the variable.
         """
         try:
-            mean_value = self.df[variable_name].mean()
-            std_value = self.df[variable_name].std()
-            self.df[variable_name] = (self.df[variable_name] - mean_value) / std_value
+            if self._plan_accepts([variable_name]):
+                self.plan.normalize([variable_name], method='std')
+                return
+            self._record_normalization([variable_name], method='std')
         except KeyError:
             raise KeyError(f"Variable '{variable_name}' not found in DataFrame.")
         except Exception as e:
@@ -204,9 +587,10 @@ class DataManager:
             variable_name (str): Name of the variable.
         """
         try:
-            q25 = self.df[variable_name].quantile(0.25)
-            q75 = self.df[variable_name].quantile(0.75)
-            self.df[variable_name] = (self.df[variable_name] - q25) / (q75 - q25)
+            if self._plan_accepts([variable_name]):
+                self.plan.normalize([variable_name], method='quantile')
+                return
+            self._record_normalization([variable_name], method='quantile')
         except KeyError:
             raise KeyError(f"Variable '{variable_name}' not found in DataFrame.")
         except Exception as e:
@@ -218,42 +602,59 @@ class DataManager:
         Standardizes all numerical features in the DataFrame.
         """
         try:
-            for variable in self.df.columns:
-                if self.get_variable_type(variable) == 'numerical':
-                    self.normalize_std(variable)
+            if self._plan_accepts([], dataset_wide=True):
+                self.plan.normalize(self.plan.numerical_columns(), method='std')
+                return
+            self._record_normalization(self._numerical_columns(), method='std')
         except Exception as e:
             raise Exception(f"An error occurred while standardizing dataset: {str(e)}")
         
-    # Standardize the entire dataset (all numerical features)
+    # Quantile normalize the entire dataset (all numerical features)
     def q_normalize_dataset(self) -> None:
         """
         Quantile normalizes all numerical features in the DataFrame.
         """
         try:
-            for variable in self.df.columns:
-                if self.get_variable_type(variable) == 'numerical':
-                    self.normalize_std(variable)
+            if self._plan_accepts([], dataset_wide=True):
+                self.plan.normalize(self.plan.numerical_columns(), method='quantile')
+                return
+            self._record_normalization(self._numerical_columns(), method='quantile')
         except Exception as e:
             raise Exception(f"An error occurred while quantile normalizing dataset: {str(e)}")
 
 
     # One-Hot Encode a variable
-    def one_hot_encode(self, variable_name: str) -> None:
+    def one_hot_encode(self, variable_name: str, sparse: bool = False) -> None:
         """
         Performs one-hot encoding on a variable.
 
         Args:
             variable_name (str): Name of the variable.
+            sparse (bool, optional): Store the indicator columns in the sparse block (`sparse_block`)
+                instead of adding them to the DataFrame. Recommended for variables with many categories.
+                Defaults to False.
         """
         try:
+            if self._plan_accepts([variable_name]):
+                self.plan.one_hot(variable_name, sparse)
+                return
+
             column = self.df[variable_name]
-            encoded_df = pd.get_dummies(column, prefix=variable_name)
 
-            # Encoding True and False to 0 and 1
-            encoded_df = encoded_df.applymap(lambda x: 1 if x > 0 else 0)
+            if sparse:
+                categories = self._append_sparse_indicators(column, prefix=variable_name)
+                self.df.drop(columns=[variable_name], inplace=True)
+                self.pipeline = self.pipeline.add('one_hot', variable_name, variable_name, categories, True)
+                self._invalidate_caches([variable_name])
+                return
+
+            encoded_df = pd.get_dummies(column, prefix=variable_name, dtype=self._indicator_dtype())
 
             self.df.drop(columns=[variable_name], inplace=True)
             self.df = pd.concat([self.df, encoded_df], axis=1)
+            self.pipeline = self.pipeline.add('one_hot', variable_name, variable_name,
+                                              list(pd.Categorical(column).categories), False)
+            self._invalidate_caches([variable_name] + encoded_df.columns.tolist())
         except KeyError:
             raise KeyError(f"Variable '{variable_name}' not found in DataFrame.")
         except Exception as e:
@@ -261,14 +662,14 @@ class DataManager:
 
 
     # One-Hot Encode entire dataset
-    def one_hot_all(self, variable_name: str) -> None:
+    def one_hot_all(self, variable_name: str = None) -> None:
         """
         Performs one-hot encoding on every categorial variable.
 
         """
         try:
-            for variable in self.df.columns:
-                if self._translate_variable_type(variable) == 'categorical':
+            for variable, variable_type in self.get_variable_types().items():
+                if variable_type == 'categorical':
                     self.one_hot_encode(variable_name=variable)
 
         except Exception as e:
@@ -279,6 +680,7 @@ class DataManager:
     def _translate_variable_type(self, variable_type: str) -> str:
         """
         Translates the variable type from pandas type.
+        Numbers and booleans are 'numerical', text, `category` and all other types are 'categorical'.
 
         Args:
             variable_type (str): Type of the variable.
@@ -286,30 +688,881 @@ class DataManager:
         Returns:
             str: Translated variable type.
         """
-        if variable_type != 'object':
-            return 'numerical'
-        return 'categorical'
+        return translate_variable_type(variable_type)
+
+    # Check that all shards of a dataset have the same schema
+    def _check_shard_schemas(self, shards: list, filenames: list) -> None:
+        """
+        Checks that all shards have the same columns and compatible variable types.
+        Integer and float columns are compatible, they are joined as float.
+
+        Args:
+            shards (list): DataFrames read from the files.
+            filenames (list): Names of the files, used in error messages.
+        """
+        reference = shards[0]
+        for shard, filename in zip(shards[1:], filenames[1:]):
+            if list(shard.columns) != list(reference.columns):
+                raise ValueError(f"File '{filename}' has different columns than '{filenames[0]}'.")
+
+        # The type of a variable comes from the first file where it has values,
+        # an empty or all-NaN column says nothing about the variable type
+        for i, name in enumerate(reference.columns):
+            reference_type, reference_file = None, None
+            for shard, filename in zip(shards, filenames):
+                column = shard.iloc[:, i]
+                if column.isna().all():
+                    continue
+                variable_type = self._translate_variable_type(column.dtype)
+                if reference_type is None:
+                    reference_type, reference_file = variable_type, filename
+                elif variable_type != reference_type:
+                    raise ValueError(f"Variable '{name}' in file '{filename}' has a different type "
+                                     f"than in '{reference_file}'.")
+
+    # Translate selected variables to column positions
+    def _resolve_usecols(self, filename: str, sep: str, header: int, usecols) -> list:
+        """
+        Translates a selection of variables to sorted column positions, using only the header of the file.
+
+        Args:
+            filename (str): Name of the CSV file.
+            sep (str): Delimiter used in the CSV file.
+            header (int): Row number to use as the column names.
+            usecols (list | range | slice): Names and/or positions of the variables, or a range/slice of positions.
+
+        Returns:
+            list: Sorted column positions, or None if all columns are selected.
+        """
+        if usecols is None:
+            return None
+        names = pd.read_csv(filename, sep=sep, header=header, nrows=0 if header is not None else 1).columns
+        names = [str(name) for name in names]
+        all_positions = list(range(len(names)))
+
+        if isinstance(usecols, (slice, range)):
+            positions = all_positions[usecols] if isinstance(usecols, slice) else [all_positions[i] for i in usecols]
+        else:
+            positions = []
+            for item in usecols:
+                if isinstance(item, (int, np.integer)):
+                    positions.append(all_positions[item])
+                elif str(item) in names:
+                    positions.append(names.index(str(item)))
+                else:
+                    raise KeyError(f"Variable '{item}' not found in the file.")
+
+        if not positions:
+            raise ValueError("No variables selected.")
+        return sorted(set(positions))
+
+    # Translate selected cases to parser arguments
+    def _row_selection(self, first_data_line: int, rows: tuple, sample_fraction: float,
+                       random_state: int) -> tuple:
+        """
+        Translates a selection of cases to the `skiprows` and `nrows` parser arguments.
+        Only data lines are ever skipped, header lines are left to the parser.
+
+        Args:
+            first_data_line (int): Line number of the first case in the file.
+            rows (tuple): `(start, stop)` range of cases, `stop` may be None.
+            sample_fraction (float): Fraction of cases to keep at random.
+            random_state (int): Seed of the sampling.
+
+        Returns:
+            tuple: `skiprows` (None, range of lines or callable) and `nrows` (int or None).
+        """
+        start, stop = rows if rows is not None else (0, None)
+        start = start or 0
+        if start < 0 or (stop is not None and stop < start):
+            raise ValueError("Invalid range of cases.")
+
+        if sample_fraction is None:
+            skiprows = range(first_data_line, first_data_line + start) if start else None
+            return skiprows, None if stop is None else stop - start
+
+        if not 0 < sample_fraction <= 1:
+            raise ValueError("Sample fraction must be between 0 and 1.")
+        seed = np.random.SeedSequence(random_state).entropy
+        last_line = None if stop is None else first_data_line + stop
+        # Decisions are drawn per block of lines from a generator seeded with the block number, so they depend
+        # only on the line: every pass over the file (and every reader) keeps the same lines
+        block_size = 65_536
+        block = {'number': None, 'keep': None}
+
+        def skip(line):
+            if line < first_data_line:
+                return False
+            if line < first_data_line + start or (last_line is not None and line >= last_line):
+                return True
+            number, offset = divmod(line - first_data_line, block_size)
+            if block['number'] != number:
+                block['number'] = number
+                block['keep'] = np.random.default_rng([seed, number]).random(block_size) < sample_fraction
+            return not block['keep'][offset]
+
+        return skip, None
+
+    # Set freshly loaded data as the initial state
+    def _set_input_df(self, input_df: pd.DataFrame) -> None:
+        """
+        Sets freshly loaded data as the initial state of the DataFrame and starts a new history.
+        The working DataFrame shares columns with the initial one, columns are never modified in place.
+
+        Args:
+            input_df (pd.DataFrame): Loaded data.
+        """
+        self.input_df = input_df
+        self.df = self.input_df.copy(deep=False)
+        self.sparse_block = None
+        self.sparse_columns = []
+        self.plan = None
+        self.pipeline = Pipeline(input_df.columns.tolist())
+        self._invalidate_caches()
+        self.history.start(self.input_df, self._state_extras())
+
+    # State kept in the history next to the DataFrame
+    def _state_extras(self) -> dict:
+        return {'sparse_block': self.sparse_block, 'sparse_columns': self.sparse_columns,
+                'plan': None if self.plan is None else self.plan.copy(), 'pipeline': self.pipeline}
+
+    # Restore a state returned by the history
+    def _restore_state(self, df: pd.DataFrame, extras: dict) -> None:
+        self.df = df
+        self.sparse_block = extras.get('sparse_block')
+        self.sparse_columns = extras.get('sparse_columns', [])
+        plan = extras.get('plan')
+        self.plan = None if plan is None else plan.copy()
+        self.pipeline = extras.get('pipeline')
+        self._invalidate_caches()
+
+    # Forget cached types of changed variables
+    def _invalidate_caches(self, names: list = None) -> None:
+        """
+        Removes cached types and type suggestions of the changed variables and the cached covariance
+        eigendecomposition. Called by every operation that changes the data.
+
+        Args:
+            names (list, optional): Names of the changed variables. Defaults to None (all variables).
+        """
+        self._data_version += 1
+        self._decomposition = None
+        if names is None:
+            self._type_cache.clear()
+            self._suggested_type_cache.clear()
+            return
+        for name in names:
+            self._type_cache.pop(name, None)
+            self._suggested_type_cache.pop(name, None)
+
+    # Fingerprint of the current data
+    def _data_fingerprint(self) -> tuple:
+        sparse_shape = None if self.sparse_block is None else self.sparse_block.shape
+        return (self._data_version, self.precision, self.df.shape, tuple(self.df.columns), sparse_shape)
+
+    # Cached covariance eigendecomposition of the current data
+    def _cached_decomposition(self):
+        if self._decomposition is not None and self._decomposition[0] == self._data_fingerprint():
+            return self._decomposition[1]
+        return None
+
+    # Reader of blocks of rows of the design matrix
+    def _row_reader(self, block: sp.csr_matrix = None):
+        """
+        Prepares reading blocks of rows of the design matrix (the DataFrame followed by the sparse block)
+        without building the whole matrix. Numerical columns are read from their arrays without copying.
+
+        Args:
+            block (sp.csr_matrix, optional): Sparse block in the precision of the computations.
+
+        Returns:
+            callable: Function of `(start, stop)` returning the rows as a dense array, safe to call from threads.
+        """
+        arrays = []
+        for i in range(self.df.shape[1]):
+            column = self.df.iloc[:, i]
+            if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biuf':
+                arrays.append(column.to_numpy())
+            else:
+                arrays.append(column.to_numpy(dtype=self.dtype, na_value=np.nan))
+        n_features = len(arrays) + (0 if block is None else block.shape[1])
+
+        def read_rows(start, stop):
+            rows = np.empty((stop - start, n_features), dtype=self.dtype, order='F')
+            for i, array in enumerate(arrays):
+                rows[:, i] = array[start:stop]
+            if block is not None:
+                rows[:, len(arrays):] = block[start:stop].toarray()
+            return rows
+
+        return read_rows
+
+    # Converted copy of a variable of the opposite type
+    def _converted_variable_type(self, column: pd.Series, name: str) -> pd.Series:
+        return convert_variable_type(column, name)
+
+    # One-hot encode a variable into the sparse block
+    def _append_sparse_indicators(self, column: pd.Series, prefix: str) -> list:
+        # The categories of `pd.get_dummies`: all categories of a `category` column (also unused ones),
+        # sorted distinct values otherwise
+        categorical = pd.Categorical(column)
+        codes, categories = np.asarray(categorical.codes), categorical.categories
+        rows = np.flatnonzero(codes >= 0)  # missing values get no indicator, as in get_dummies
+        encoded = self._indicator_matrix(rows, codes[rows], len(column), len(categories))
+
+        if self.sparse_block is None:
+            self.sparse_block = encoded
+        else:
+            self.sparse_block = sp.hstack([self.sparse_block, encoded], format='csr')
+        self.sparse_columns = self.sparse_columns + [f'{prefix}_{category}' for category in categories]
+        return list(categories)
+
+    # Check whether an operation can be recorded in the plan
+    def _plan_accepts(self, names: list, dataset_wide: bool = False) -> bool:
+        """
+        Decides whether an operation is recorded in the plan (lazy mode) or executed immediately.
+        Operations on variables the plan cannot follow (sparse variables, indicators of a pending
+        one-hot encoding) execute the pending plan first and then run immediately.
+
+        Args:
+            names (list): Names of the variables the operation refers to.
+            dataset_wide (bool, optional): The operation applies to all numerical variables. Defaults to False.
+
+        Returns:
+            bool: True if the operation should be recorded.
+        """
+        if not self.lazy:
+            return False
+        if self.plan is None:
+            self.plan = TransformPlan(self.df.columns.tolist(),
+                                      [self._translate_variable_type(dtype) for dtype in self.df.dtypes])
+        if all(self.plan.has_column(name) for name in names) \
+                and not (dataset_wide and self.plan.has_dense_one_hot()):
+            return True
+        self.execute_plan()
+        return False
+
+    # Execute recorded operations
+    def execute_plan(self) -> None:
+        """
+        Executes the operations recorded in lazy mode in a single pass (see `CompiledPlan`):
+        deleted variables are never processed, rows with missing values are removed with one selection,
+        normalizations shared by many variables run as one vectorized operation and all indicator
+        columns are added at once.
+        """
+        if self.plan is None:
+            return
+        if len(self.plan) == 0:
+            self.plan = None
+            return
+
+        base = self.df
+        sparse_state = (self.sparse_block, self.sparse_columns)
+        pipeline = self.pipeline
+        try:
+            compiled = self.plan.compile()
+            kept = compiled.kept_sources()
+            base_names = base.columns.tolist()
+
+            rows = slice(None)
+            if compiled.nan_sources is not None:
+                rows = base.iloc[:, compiled.nan_sources].notna().all(axis=1).to_numpy()
+                if self.sparse_block is not None:
+                    self.sparse_block = self.sparse_block[rows]
+                self.pipeline = self.pipeline.add('remove_nan', [base_names[i] for i in compiled.nan_sources])
+            if len(kept) < len(base_names):
+                self.pipeline = self.pipeline.add('delete', [name for i, name in enumerate(base_names) if i not in kept])
+
+            # Positions in the base DataFrame serve as unique labels until the final names are set
+            late = compiled.filters_late()
+            self.df = base.iloc[slice(None) if late else rows, kept].copy(deep=False)
+            self.df.columns = kept
+
+            for k, step in enumerate(compiled.steps()):
+                for operation, sources in step.items():
+                    if operation[0] == 'change_type':
+                        for source in sources:
+                            self.df[source] = self._converted_variable_type(self.df[source], str(base.columns[source]))
+                        self.pipeline = self.pipeline.add('change_type', [base_names[i] for i in sources])
+                        continue
+                    # Variables normalized before the NaN removal take their statistics from all rows
+                    groups = [(sources, None)]
+                    if late:
+                        before = [source for source in sources if compiled.unfiltered(k, source)]
+                        groups = [(before, None), ([source for source in sources if source not in before], rows)]
+                    for group, statistics_rows in groups:
+                        if group:
+                            location, scale = self._normalize_columns(group, method=operation[1], rows=statistics_rows)
+                            self.pipeline = self.pipeline.add('normalize', [base_names[i] for i in group],
+                                                              location, scale)
+
+            if late:
+                # Encodings recorded before the NaN removal keep the categories of the removed rows
+                for column in compiled.encoded:
+                    if column.unfiltered_categories:
+                        self.df[column.source] = self.df[column.source].astype('category')
+                self.df = self.df[rows]
+
+            encoded_parts = []
+            for column in compiled.encoded:
+                _, prefix, sparse = column.one_hot
+                if sparse:
+                    categories = self._append_sparse_indicators(self.df[column.source], prefix=prefix)
+                else:
+                    encoded_parts.append(pd.get_dummies(self.df[column.source], prefix=prefix,
+                                                        dtype=self._indicator_dtype()))
+                    categories = list(pd.Categorical(self.df[column.source]).categories)
+                self.pipeline = self.pipeline.add('one_hot', base_names[column.source], prefix, categories, sparse)
+
+            names = {column.source: column.name for column in compiled.columns}
+            renamed = {base_names[source]: name for source, name in names.items() if base_names[source] != name}
+            if renamed:
+                self.pipeline = self.pipeline.add('rename', renamed)
+            remaining = self.df.drop(columns=[column.source for column in compiled.encoded]).rename(columns=names)
+            self.df = pd.concat([remaining] + encoded_parts, axis=1) if encoded_parts else remaining
+            self.plan = None
+            self._invalidate_caches()
+        except Exception as e:
+            # The plan is kept, the data stays as it was before execution
+            self.df = base
+            self.sparse_block, self.sparse_columns = sparse_state
+            self.pipeline = pipeline
+            raise Exception(f"An error occurred while executing recorded operations: {str(e)} "
+                            f"The recorded operations can be dropped with `discard_plan` or undone with `undo`.")
+
+    # Build a 0/1 indicator matrix in CSR format
+    def _indicator_matrix(self, rows: np.ndarray, codes: np.ndarray, n_rows: int, n_categories: int) -> sp.csr_matrix:
+        data = np.ones(len(rows), dtype=self.dtype)
+        return sp.csr_matrix((data, (rows, codes)), shape=(n_rows, n_categories))
+
+    # Type of dense one-hot indicators
+    def _indicator_dtype(self):
+        return int if self.precision == 'float64' else self.dtype
+
+    # Downcast variables to compact types
+    def _compact_dtypes(self, df: pd.DataFrame, category_ratio: float = 0.5) -> pd.DataFrame:
+        """
+        Returns a copy of the DataFrame with compact column types: integers are downcast to the smallest
+        integer type holding their values, floats to float32 and text variables with few distinct values
+        are stored as `category`.
+
+        Args:
+            df (pd.DataFrame): Data to compact.
+            category_ratio (float, optional): Text variables with at most this fraction of distinct values
+                become `category`. Defaults to 0.5.
+
+        Returns:
+            pd.DataFrame: Compacted data.
+        """
+        columns = {}
+        for i in range(df.shape[1]):
+            column = df.iloc[:, i]
+            if pd.api.types.is_bool_dtype(column.dtype):
+                pass
+            elif pd.api.types.is_integer_dtype(column.dtype):
+                column = pd.to_numeric(column, downcast='integer')
+            elif pd.api.types.is_float_dtype(column.dtype):
+                column = pd.to_numeric(column, downcast='float')
+            elif self._translate_variable_type(column.dtype) == 'categorical' \
+                    and not isinstance(column.dtype, pd.CategoricalDtype) and len(column) > 0 \
+                    and column.nunique() <= category_ratio * len(column):
+                column = column.astype('category')
+            columns[i] = column
+
+        compact_df = pd.concat(columns, axis=1) if columns else df.copy()
+        compact_df.columns = df.columns
+        return compact_df
+
+    # Names of all numerical variables
+    def _numerical_columns(self) -> list:
+        return [name for name, dtype in self.df.dtypes.items() if self._translate_variable_type(dtype) == 'numerical']
+
+    # Normalize variables and record the statistics in the pipeline
+    def _record_normalization(self, names: list, method: str) -> None:
+        location, scale = self._normalize_columns(names, method)
+        if names:
+            self.pipeline = self.pipeline.add('normalize', list(names), location, scale)
+
+    # Normalize a group of variables in a single vectorized pass
+    def _normalize_columns(self, names: list, method: str, rows: np.ndarray = None) -> tuple:
+        """
+        Normalizes variables as one block: all location and scale statistics are computed
+        in a single pass over the block and applied with one array operation.
+        Constant variables are only centered.
+
+        Args:
+            names (list): Names of the variables.
+            method (str): 'std' for standard normalization (mean, standard deviation)
+                or 'quantile' for quantile-based normalization (first quartile, interquartile range).
+            rows (np.ndarray, optional): Boolean mask of the rows the statistics are computed on.
+                Defaults to all rows.
+
+        Returns:
+            tuple: Location and scale of every variable.
+        """
+        if method not in ('std', 'quantile'):
+            raise ValueError(f"Unknown normalization method '{method}'.")
+        if not names:
+            return np.empty(0), np.empty(0)
+
+        block = self.df[names].to_numpy(dtype=self.dtype, copy=True)  # a new array, safe to modify in place
+        sample = block if rows is None else block[rows]
+
+        # Statistics are accumulated in double precision also in 'float32' mode
+        if method == 'std':
+            location = np.nanmean(sample, axis=0, dtype=np.float64)
+            scale = np.nanstd(sample, axis=0, ddof=1, dtype=np.float64)
+        else:
+            location, q75 = np.nanquantile(sample, [0.25, 0.75], axis=0)
+            location, q75 = location.astype(np.float64), q75.astype(np.float64)
+            scale = q75 - location
+        scale[~(scale > 0)] = 1.0
+
+        block -= location.astype(self.dtype)
+        block /= scale.astype(self.dtype)
+        self.df[names] = block
+        self._invalidate_caches(names)
+        return location, scale
+
+    # Batches of rows of the source file
+    def _source_batches(self, batch_size: int, use_cache: bool = True):
+        """
+        Prepares streaming of the source file with the columns and types of the loaded data
+        (before any executed operation).
+
+        Args:
+            batch_size (int): Number of rows per batch.
+            use_cache (bool, optional): Read the cached binary copy of the file, if present. Defaults to True.
+
+        Returns:
+            callable: Returns a new iterator over the batches (DataFrames) every time it is called.
+        """
+        filename, sep, header, usecols = (self.source[key] for key in ('filename', 'sep', 'header', 'usecols'))
+        names = pd.read_csv(filename, sep=sep, header=header, nrows=0 if header is not None else 1).columns
+        names = [str(name) for name in names]
+        positions = list(range(len(names))) if usecols is None else list(usecols)
+        loaded = self.input_df.columns.tolist()
+        if [names[position] for position in positions] != loaded:
+            raise ValueError("The loaded variables do not match the file.")
+
+        # Types of the loaded data, so every batch is parsed the same way
+        labels = [f'c{i}' for i in range(len(names))]
+        dtypes = {}
+        for position, dtype in zip(positions, self.input_df.dtypes):
+            if self._translate_variable_type(dtype) == 'categorical':
+                dtypes[labels[position]] = str
+            elif pd.api.types.is_integer_dtype(dtype):
+                dtypes[labels[position]] = 'Int64'  # a batch may contain missing values
+            elif pd.api.types.is_float_dtype(dtype):
+                dtypes[labels[position]] = np.float64
+
+        def batches():
+            cached = self.csv_cache.iter_batches(filename, sep, header, batch_size) if use_cache else None
+            if cached is not None:
+                for batch in cached:
+                    yield batch.iloc[:, positions]
+                return
+            reader = pd.read_csv(filename, sep=sep, header=None, skiprows=0 if header is None else header + 1,
+                                 names=labels, usecols=[labels[position] for position in positions],
+                                 dtype=dtypes, chunksize=batch_size)
+            for chunk in reader:
+                batch = chunk[[labels[position] for position in positions]]
+                batch.columns = loaded
+                yield batch
+
+        return batches
+
+    # Stream a CSV file in chunks, building every column from per-chunk arrays
+    def _read_csv_chunked(self, filename: str, sep: str, header: int, chunksize: int,
+                          progress_callback=None, sample_size: int = 1000, usecols: list = None,
+                          skiprows=None, nrows: int = None) -> pd.DataFrame:
+        """
+        Reads a CSV file chunk by chunk so that the whole text is never parsed at once.
+        Each column is assembled from its per-chunk pieces.
+        Text columns of a sample of the first rows are read as text in every chunk, other columns are left
+        to the parser. A column that turns out to contain text only in later chunks is read again as text,
+        so the result has the same dtypes as reading the whole file at once.
+
+        Args:
+            filename (str): Name of the CSV file.
+            sep (str): Delimiter used in the CSV file.
+            header (int): Row number to use as the column names.
+            chunksize (int): Number of rows per chunk.
+            progress_callback (callable, optional): Called with the fraction of the file read so far.
+            sample_size (int, optional): Number of rows used for dtype inference. Defaults to 1000.
+            usecols (list, optional): Sorted positions of the columns to read. Defaults to None (all).
+            skiprows (range | callable, optional): Data lines to skip, as returned by `_row_selection`.
+            nrows (int, optional): Maximum number of rows to read. Defaults to None.
+
+        Returns:
+            pd.DataFrame: Parsed data.
+        """
+        if chunksize <= 0:
+            raise ValueError("Chunk size must be greater than zero.")
+
+        # The sample skips the same lines as the read, so skipped lines (ex. a header line left out with
+        # `header=None`) do not turn numeric columns into text
+        sample = pd.read_csv(filename, sep=sep, header=header, skiprows=skiprows,
+                             nrows=sample_size if nrows is None else min(sample_size, nrows))
+        # Columns are addressed by position labels, so duplicated header names are not an issue
+        labels = [f'c{i}' for i in range(len(sample.columns))]
+        positions = list(range(len(labels))) if usecols is None else list(usecols)
+        sample = sample.iloc[:, positions]
+        # Text columns stay text in every chunk. Other columns are left to the parser, a later chunk may
+        # contain NaN in an integer column or text in a numeric one.
+        dtypes = {labels[position]: dtype for position, dtype in zip(positions, sample.dtypes)
+                  if not pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)}
+
+        # The header lines are skipped together with the unselected data lines
+        first_data_line = 0 if header is None else header + 1
+        if skiprows is None:
+            skiprows = first_data_line
+        elif isinstance(skiprows, range):
+            skiprows = range(0, skiprows.stop)
+        else:
+            skip_data_line = skiprows
+            skiprows = lambda line: line < first_data_line or skip_data_line(line)
+
+        file_size = os.path.getsize(filename)
+        blocks = [[] for _ in positions]
+
+        def read_chunks(columns: list, column_dtypes: dict, report: bool):
+            with open(filename, 'rb') as handle:
+                reader = pd.read_csv(handle, sep=sep, header=None, skiprows=skiprows, nrows=nrows, names=labels,
+                                     usecols=[labels[positions[i]] for i in columns], dtype=column_dtypes,
+                                     chunksize=chunksize)
+                for chunk in reader:
+                    for i in columns:
+                        blocks[i].append(chunk[labels[positions[i]]])
+
+                    if report and progress_callback is not None and file_size > 0:
+                        progress_callback(min(handle.tell() / file_size, 1.0))
+
+        read_chunks(list(range(len(positions))), dtypes, True)
+
+        # Columns parsed as numbers in some chunks and as text in others are read again as text
+        mixed = [i for i in range(len(positions))
+                 if len({pd.api.types.is_numeric_dtype(block) or pd.api.types.is_bool_dtype(block)
+                         for block in blocks[i]}) > 1]
+        if mixed:
+            n_rows = sum(len(block) for block in blocks[mixed[0]])
+            for i in mixed:
+                blocks[i] = []
+            read_chunks(mixed, {labels[positions[i]]: str for i in mixed}, False)
+            # Both passes must keep the same lines, otherwise the columns would not be aligned
+            if sum(len(block) for block in blocks[mixed[0]]) != n_rows:
+                raise ValueError("The file changed while it was being read.")
+
+        data = {}
+        for i in range(len(blocks)):
+            data[i] = pd.concat(blocks[i], ignore_index=True) if blocks[i] else sample.iloc[:0, i]
+            blocks[i] = None  # release chunk arrays as soon as the column is assembled
+
+        df = pd.concat(data, axis=1)
+        df.columns = sample.columns
+
+        if progress_callback is not None:
+            progress_callback(1.0)
+
+        return df
 
     # PCA
 
     # Function performing PCA analysis returning a separate PCAHandler object.
-    def PCA(self, n_components: int) -> PCAHandler:
+    def PCA(self, n_components, svd_solver: str = 'auto', random_state: int = None,
+            n_jobs: int = None) -> PCAHandler:
         """
         Performs PCA analysis and returns a PCAHandler object.
+        If some variables were one-hot encoded into the sparse block, the mixed dense and sparse
+        design matrix is decomposed directly, without converting it to a dense array.
 
         Args:
-            n_components (int): Number of principal components to keep.
+            n_components (int, float or str): Number of principal components to keep, the cumulative
+                explained variance to reach (ex. 0.95) or 'mle' (Minka's estimate). With a target variance
+                only the needed leading components are computed (see `PCASolver.fit`). At least two
+                components are kept.
+            svd_solver (str, optional): 'full', 'randomized', 'arpack', 'covariance' or 'auto' (chosen from
+                the shape of the data and `n_components`, see `PCASolver.choose`). Defaults to 'auto'.
+            random_state (int, optional): Seed of the randomized and ARPACK solvers. Defaults to None.
+            n_jobs (int, optional): Threads computing the covariance matrix. Defaults to None (all cores).
 
         Returns:
-            PCAHandler: PCAHandler object containing PCA results.
+            PCAHandler: PCAHandler object containing PCA results. Its `fit_info` reports the solver used,
+            the time taken and the approximation error. The fitted model and the executed operations are kept,
+            so new data can be projected with `PCAHandler.transform`.
+
+        The eigendecomposition computed by the 'covariance' solver is kept until the data changes,
+        so running PCA again with another number of components only computes the scores.
+        For tall data the covariance matrix is accumulated from blocks of rows in a thread pool,
+        without building the whole design matrix (see `PCASolver.fit_blocks`).
         """
         try:
-            pca_data = PCA(n_components=n_components)
-            principal_components = pca_data.fit_transform(self.df)  # PCA Analysis
-            explained_variance = pca_data.explained_variance_ratio_ # Explained variance
+            self.execute_plan()
+            block = None
+            if self.sparse_block is not None and self.sparse_block.shape[1] > 0:
+                block = self.sparse_block.tocsr().astype(self.dtype)
+
+            solver = PCASolver(svd_solver=svd_solver, random_state=random_state, dtype=self.dtype, n_jobs=n_jobs,
+                               min_components=2)
+            n_samples, n_features = len(self.df), len(self.get_variable_names())
+            if solver.choose(n_samples, n_features, n_components, sparse=block is not None) == 'covariance' \
+                    and n_features <= n_samples:
+                principal_components = solver.fit_blocks(self._row_reader(block), n_samples, n_features,
+                                                         n_components, decomposition=self._cached_decomposition())
+            else:
+                principal_components = solver.fit(self.df.to_numpy(dtype=self.dtype), block, n_components,
+                                                  decomposition=self._cached_decomposition())
+            if solver.decomposition is not None:
+                self._decomposition = (self._data_fingerprint(), solver.decomposition)
 
             pca_df = pd.DataFrame(data=principal_components,  columns=None)  # Prepare PCA object
 
-            return PCAHandler(pca_df, explained_variance=explained_variance)
+            return PCAHandler(pca_df, explained_variance=solver.explained_variance, fit_info=solver.fit_info,
+                              components=solver.components, mean=solver.mean, preprocessor=self.pipeline,
+                              feature_names=self.get_variable_names(), precision=self.precision,
+                              explained_variance_all=None if solver.decomposition is None
+                              else solver.decomposition['explained_variance'])
         except Exception as e:
             raise Exception(f"An error occurred during PCA analysis: {str(e)}")
+
+    # Kernel PCA with a Nystroem approximation
+    def kernel_PCA(self, n_components, kernel: str = 'rbf', n_landmarks: int = 500, gamma: float = None,
+                   degree: int = 3, coef0: float = 1.0, svd_solver: str = 'auto', random_state: int = None,
+                   chunk_size: int = 10_000) -> PCAHandler:
+        """
+        Performs kernel PCA, which finds non-linear structure linear PCA misses. Exact kernel PCA needs
+        the n x n kernel matrix, here the kernel is approximated with `n_landmarks` randomly chosen rows
+        (Nystroem method): every row is mapped to `n_landmarks` features computed from its kernel values
+        with the landmarks, and linear PCA is run on these features. Memory grows linearly with the
+        number of rows.
+
+        Args:
+            n_components (int, float or str): Number of principal components, the cumulative explained
+                variance to reach or 'mle' (see `PCA`).
+            kernel (str, optional): 'rbf' or 'poly'. Defaults to 'rbf'.
+            n_landmarks (int, optional): Number of landmark rows. More landmarks give a better approximation.
+                Defaults to 500.
+            gamma (float, optional): Kernel coefficient. Defaults to None (1 / number of variables).
+            degree (int, optional): Degree of the polynomial kernel. Defaults to 3.
+            coef0 (float, optional): Constant term of the polynomial kernel. Defaults to 1.
+            svd_solver (str, optional): Solver of the linear PCA (see `PCA`). Defaults to 'auto'.
+            random_state (int, optional): Seed of the landmark selection and the solver. Defaults to None.
+            chunk_size (int, optional): Rows mapped to the features at once. Defaults to 10 000.
+
+        Returns:
+            PCAHandler: PCAHandler object containing kernel PCA results. New data is projected with
+            `PCAHandler.transform`, the loadings of the original variables are not defined.
+        """
+        try:
+            if kernel not in ('rbf', 'poly'):
+                raise ValueError(f"Unknown kernel '{kernel}'. Available kernels: rbf, poly.")
+            if n_landmarks <= 0:
+                raise ValueError("Number of landmarks must be greater than zero.")
+            self.execute_plan()
+            block = None
+            if self.sparse_block is not None and self.sparse_block.shape[1] > 0:
+                block = self.sparse_block.tocsr().astype(self.dtype)
+            read_rows = self._row_reader(block)
+            n_samples = len(self.df)
+
+            start = time.perf_counter()
+            rng = np.random.default_rng(random_state)
+            landmarks = np.sort(rng.choice(n_samples, size=min(n_landmarks, n_samples), replace=False))
+            feature_map = Nystroem(kernel=kernel, gamma=gamma, degree=degree, coef0=coef0,
+                                   n_components=len(landmarks), random_state=random_state)
+            feature_map.fit(np.vstack([read_rows(row, row + 1) for row in landmarks]))
+
+            features = np.empty((n_samples, len(landmarks)), dtype=self.dtype)
+            for row in range(0, n_samples, chunk_size):
+                stop = min(row + chunk_size, n_samples)
+                features[row:stop] = feature_map.transform(read_rows(row, stop))
+            mapping_time = time.perf_counter() - start
+
+            solver = PCASolver(svd_solver=svd_solver, random_state=random_state, dtype=self.dtype, min_components=2)
+            principal_components = solver.fit(features, None, n_components)
+            features = None
+
+            fit_info = dict(solver.fit_info, kernel=kernel, n_landmarks=len(landmarks),
+                            time=solver.fit_info['time'] + mapping_time)
+            pca_df = pd.DataFrame(data=principal_components, columns=None)
+            return PCAHandler(pca_df, explained_variance=solver.explained_variance, fit_info=fit_info,
+                              components=solver.components, mean=solver.mean, preprocessor=self.pipeline,
+                              precision=self.precision, feature_map=feature_map)
+        except Exception as e:
+            raise Exception(f"An error occurred during kernel PCA analysis: {str(e)}")
+
+    # Stability of the principal components
+    def PCA_stability(self, n_components: int, n_resamples: int = 200, method: str = 'bootstrap',
+                      confidence: float = 0.95, time_budget: float = 30.0, max_workers: int = None,
+                      random_state: int = None) -> dict:
+        """
+        Estimates how stable the principal components are by refitting PCA on resampled rows
+        in a process pool (see `StabilityAnalysis`).
+
+        Args:
+            n_components (int): Number of principal components.
+            n_resamples (int, optional): Number of refits. Defaults to 200.
+            method (str, optional): 'bootstrap' (rows drawn with replacement) or 'subsample'
+                (half of the rows drawn without replacement). Defaults to 'bootstrap'.
+            confidence (float, optional): Confidence level of the intervals. Defaults to 0.95.
+            time_budget (float, optional): Seconds after which the refits done so far are reported.
+                None for no limit. Defaults to 30.
+            max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            random_state (int, optional): Seed of the resampling. Defaults to None.
+
+        Returns:
+            dict: Confidence intervals of the explained variance ratios ('explained_variance') and of
+            the loadings ('loadings', 'loadings_lower', 'loadings_upper'), number of refits done ('n_resamples').
+        """
+        try:
+            self.execute_plan()
+            block = None
+            if self.sparse_block is not None and self.sparse_block.shape[1] > 0:
+                block = self.sparse_block.tocsr().astype(self.dtype)
+            names = self.get_variable_names()
+            analysis = StabilityAnalysis(n_resamples=n_resamples, method=method, confidence=confidence,
+                                         time_budget=time_budget, max_workers=max_workers,
+                                         random_state=random_state, dtype=self.dtype)
+            # The sparse block is shared with the workers as it is, only the DataFrame part is made dense
+            return analysis.run(self._row_reader(), len(self.df), len(names), n_components, feature_names=names,
+                                block=block)
+        except Exception as e:
+            raise Exception(f"An error occurred during PCA stability analysis: {str(e)}")
+
+    # Explained variance of all components
+    def explained_variance_ratio(self, n_components: int = None) -> np.ndarray:
+        """
+        Gets the explained variance ratios of the principal components from the covariance
+        eigendecomposition, computed once and kept until the data changes.
+
+        Args:
+            n_components (int, optional): Number of leading components. Defaults to None (all components).
+
+        Returns:
+            np.ndarray: Explained variance ratios (cumulative values with `np.cumsum`).
+        """
+        try:
+            self.execute_plan()
+            decomposition = self._cached_decomposition()
+            if decomposition is None:
+                block = None
+                if self.sparse_block is not None and self.sparse_block.shape[1] > 0:
+                    block = self.sparse_block.tocsr().astype(self.dtype)
+                solver = PCASolver(svd_solver='covariance', dtype=self.dtype)
+                n_samples, n_features = len(self.df), len(self.get_variable_names())
+                if n_features <= n_samples:
+                    decomposition = solver.decompose_blocks(self._row_reader(block), n_samples, n_features)
+                else:
+                    decomposition = solver.decompose(self.df.to_numpy(dtype=self.dtype), block)
+                self._decomposition = (self._data_fingerprint(), decomposition)
+            return decomposition['explained_variance'][:n_components]
+        except Exception as e:
+            raise Exception(f"An error occurred while computing the explained variance: {str(e)}")
+
+    # Out-of-core PCA streaming the source file
+    def incremental_PCA(self, n_components: int, batch_size: int = 100_000, scores_path: str = None,
+                        use_cache: bool = True, progress_callback=None) -> PCAHandler:
+        """
+        Performs PCA without loading the whole dataset. The source CSV file (or its cached binary copy)
+        is streamed in batches of rows. Operations already executed are replayed on every batch with the parameters
+        fitted on the loaded data (see `Pipeline`), then the operations recorded in lazy mode are applied
+        with parameters fitted on the whole file (see `Preprocessor`). The passes over the data are:
+
+        1. fitting normalization statistics and one-hot categories (usually a single pass),
+        2. fitting the components with partial updates (`IncrementalPCA.partial_fit`),
+        3. writing the principal component scores to a `.npy` file.
+
+        The loaded data only serves as the schema, so it can be a small part of the file
+        (ex. read with `rows=(0, 10000)`), the whole file is always streamed. Normalizations and one-hot
+        encodings should then be recorded in lazy mode, so that their statistics come from the whole file.
+        Variables one-hot encoded into the sparse block outside lazy mode are not supported.
+
+        Args:
+            n_components (int): Number of principal components to keep.
+            batch_size (int, optional): Number of rows per batch. Defaults to 100 000.
+            scores_path (str, optional): Path of the `.npy` file for the scores. Defaults to a new temporary file.
+            use_cache (bool, optional): Stream the cached binary copy of the file, if present. Defaults to True.
+            progress_callback (callable, optional): Called with the fraction of work done (0.0 - 1.0).
+
+        Returns:
+            PCAHandler: PCAHandler object with the scores memory-mapped from `scores_path`.
+        """
+        try:
+            if self.source is None:
+                raise ValueError("Out-of-core PCA needs data read from a single CSV file.")
+            if batch_size <= 0:
+                raise ValueError("Batch size must be greater than zero.")
+            if self.sparse_block is not None:
+                raise ValueError("Variables one-hot encoded into the sparse block outside lazy mode "
+                                 "are not supported.")
+
+            batches = self._source_batches(batch_size, use_cache)
+            plan = self.plan if self.plan is not None else TransformPlan(
+                self.df.columns.tolist(), [self.get_variable_type(name) for name in self.df.columns])
+            preprocessor = Preprocessor(plan.compile(), self.df.columns.tolist(),
+                                        pipeline=self.pipeline if len(self.pipeline) > 0 else None)
+
+            n_passes = preprocessor.n_passes() + 2
+            done = [0]
+
+            def batches_with_progress():
+                for batch in batches():
+                    yield batch
+                if progress_callback is not None:
+                    done[0] += 1
+                    progress_callback(done[0] / n_passes)
+
+            start = time.perf_counter()
+            preprocessor.fit(batches_with_progress)
+
+            # Incremental updates only keep the fitted subspace between batches. A few additional components
+            # are tracked and dropped at the end, which makes the leading ones practically exact.
+            n_fitted = min(n_components + 10, len(preprocessor.feature_names))
+            if not 0 < n_components <= n_fitted:
+                raise ValueError(f"Number of components must be between 1 and {n_fitted}.")
+            incremental_pca = IncrementalPCA(n_components=n_fitted)
+            pending = None
+            for batch in batches_with_progress():
+                rows = preprocessor.transform(batch).to_numpy(dtype=self.dtype)
+                # Every partial update needs at least as many rows as components
+                if pending is None:
+                    pending = rows
+                elif len(pending) < n_fitted or len(rows) < n_fitted:
+                    pending = np.vstack([pending, rows])
+                else:
+                    incremental_pca.partial_fit(pending)
+                    pending = rows
+            if pending is None or len(pending) < n_fitted:
+                raise ValueError("Not enough rows for the requested number of components.")
+            incremental_pca.partial_fit(pending)
+            pending = None
+            components = incremental_pca.components_[:n_components]
+            elapsed = time.perf_counter() - start
+
+            if scores_path is None:
+                handle, scores_path = tempfile.mkstemp(prefix='pca_scores_', suffix='.npy')
+                os.close(handle)
+            scores = np.lib.format.open_memmap(scores_path, mode='w+', dtype=self.dtype,
+                                               shape=(int(incremental_pca.n_samples_seen_), n_components))
+            position = 0
+            for batch in batches_with_progress():
+                rows = preprocessor.transform(batch).to_numpy(dtype=self.dtype)
+                scores[position:position + len(rows)] = (rows - incremental_pca.mean_) @ components.T
+                position += len(rows)
+            scores.flush()
+            scores = None
+
+            explained_variance = incremental_pca.explained_variance_ratio_[:n_components]
+            fit_info = {
+                'svd_solver': 'incremental',
+                'time': elapsed,
+                'reconstruction_error': float(np.sqrt(max(0.0, 1.0 - explained_variance.sum()))),
+                'max_residual': None,  # would need another pass over the data
+            }
+            pca_df = pd.DataFrame(np.load(scores_path, mmap_mode='r'), copy=False)
+            return PCAHandler(pca_df, explained_variance=explained_variance, fit_info=fit_info,
+                              scores_path=scores_path, components=components, mean=incremental_pca.mean_,
+                              preprocessor=preprocessor, feature_names=preprocessor.feature_names,
+                              precision=self.precision)
+        except Exception as e:
+            raise Exception(f"An error occurred during out-of-core PCA analysis: {str(e)}")
@@ -0,0 +1,135 @@
+import pandas as pd
+
+
+class _Snapshot:
+    """
+    State of a DataFrame stored as references to its columns,
+    together with any additional state kept next to it (never copied).
+    """
+
+    def __init__(self, df: pd.DataFrame, description: str = None, extras: dict = None) -> None:
+        self.description = description
+        self.extras = dict(extras) if extras else {}
+        self.index = df.index
+        self.columns = list(df.columns)
+        # Column objects are only referenced, the underlying arrays are not copied
+        self.data = [df.iloc[:, i] for i in range(df.shape[1])]
+
+    def restore(self) -> tuple:
+        if not self.data:
+            df = pd.DataFrame(index=self.index)
+        else:
+            df = pd.concat(self.data, axis=1)
+            df.columns = self.columns
+        return df, dict(self.extras)
+
+
+class DataHistory:
+    """
+    Multi-level undo/redo history of a DataFrame.
+
+    Every saved state keeps references to the columns of the DataFrame instead of a full copy.
+    DataManager never modifies a column in place (every operation replaces whole columns),
+    so unchanged columns are shared by all saved states and each state only costs the memory
+    of the columns its operation replaced.
+
+    Additional state (e.g. the sparse one-hot block) can be saved as `extras`, a dictionary of
+    objects that are never modified in place. Restoring a state returns a `(DataFrame, extras)` tuple.
+    """
+
+    def __init__(self, max_depth: int = None) -> None:
+        self.max_depth = max_depth
+        self.initial = None
+        self.undo_stack = []
+        self.redo_stack = []
+
+    # Start a new history
+    def start(self, df: pd.DataFrame, extras: dict = None) -> None:
+        """
+        Clears the history and sets the initial state.
+
+        Args:
+            df (pd.DataFrame): Initial state of the DataFrame.
+            extras (dict, optional): Additional state saved together with the DataFrame.
+        """
+        self.initial = _Snapshot(df, description='initial', extras=extras)
+        self.undo_stack = []
+        self.redo_stack = []
+
+    # Save a state
+    def push(self, df: pd.DataFrame, description: str = None, extras: dict = None) -> None:
+        """
+        Saves a state of the DataFrame. Discards all states that could be redone.
+
+        Args:
+            df (pd.DataFrame): State of the DataFrame to save.
+            description (str, optional): Description of the operation that follows the saved state.
+            extras (dict, optional): Additional state saved together with the DataFrame.
+        """
+        self.undo_stack.append(_Snapshot(df, description, extras))
+        self.redo_stack = []
+        if self.max_depth is not None and len(self.undo_stack) > self.max_depth:
+            self.undo_stack.pop(0)
+
+    # Step back
+    def undo(self, df: pd.DataFrame, extras: dict = None) -> tuple:
+        """
+        Returns the last saved state. The current state can be brought back with `redo`.
+        If no state was saved, the initial state is returned.
+
+        Args:
+            df (pd.DataFrame): Current state of the DataFrame.
+            extras (dict, optional): Current additional state.
+
+        Returns:
+            tuple: Restored DataFrame and additional state.
+        """
+        if self.initial is None:
+            raise ValueError("History is empty.")
+        snapshot = self.undo_stack.pop() if self.undo_stack else self.initial
+        self.redo_stack.append(_Snapshot(df, snapshot.description, extras))
+        return snapshot.restore()
+
+    # Step forward
+    def redo(self, df: pd.DataFrame, extras: dict = None) -> tuple:
+        """
+        Returns the state reverted by the last `undo`.
+
+        Args:
+            df (pd.DataFrame): Current state of the DataFrame.
+            extras (dict, optional): Current additional state.
+
+        Returns:
+            tuple: Restored DataFrame and additional state.
+        """
+        if not self.redo_stack:
+            raise ValueError("Nothing to redo.")
+        snapshot = self.redo_stack.pop()
+        self.undo_stack.append(_Snapshot(df, snapshot.description, extras))
+        return snapshot.restore()
+
+    # Go back to the beginning
+    def reset(self) -> tuple:
+        """
+        Returns the initial state and clears the undo and redo stacks.
+
+        Returns:
+            tuple: Initial DataFrame and additional state.
+        """
+        if self.initial is None:
+            raise ValueError("History is empty.")
+        self.undo_stack = []
+        self.redo_stack = []
+        return self.initial.restore()
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+    def descriptions(self) -> list:
+        """
+        Returns descriptions of the saved states, from the oldest one.
+        """
+        return [snapshot.description for snapshot in self.undo_stack]
@@ -1,11 +1,35 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from itertools import combinations
-from sklearn.metrics import silhouette_score
 
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
-from sklearn.cluster import KMeans, DBSCAN
-from sklearn.metrics import pairwise_distances
+from scipy import sparse
+from sklearn.cluster import KMeans, MiniBatchKMeans, DBSCAN
+from sklearn.neighbors import NearestNeighbors
+from threadpoolctl import threadpool_limits
+
+from .shared_array import SharedArray, attach_shared_array
+from .silhouette import SilhouetteScorer
+
+# Scores attached by a worker process of the cluster number sweep
+_worker_state = {}
+
+
+# Attach the shared scores (runs in a worker process)
+def _init_sweep_worker(spec: tuple) -> None:
+    _worker_state['memory'], _worker_state['scores'] = attach_shared_array(spec)
+
+
+# Fit K-means for one number of clusters and score it (runs in a worker process)
+def _score_kmeans(num_clusters: int, random_state: int, scorer: SilhouetteScorer) -> tuple:
+    scores = _worker_state['scores']
+    # One thread per process, the pool already uses all cores
+    with threadpool_limits(limits=1):
+        kmeans = KMeans(n_clusters=num_clusters, n_init='auto', random_state=random_state)
+        cluster_labels = kmeans.fit_predict(scores)
+        return num_clusters, scorer.evaluate(scores, cluster_labels)
 
 
 class PCAHandler:
@@ -14,27 +38,304 @@ class PCAHandler:
     DataManager, including clustering and generating plots.
     """
 
-    def __init__(self, data: pd.DataFrame, explained_variance) -> None:
+    # Bump when the saved model layout changes
+    MODEL_FORMAT_VERSION = 1
+    # Smallest number of rows clustered with mini-batch K-means by default
+    MINI_BATCH_MIN_ROWS = 100_000
+    # Largest number of stored distances of the radius neighbours graph shared by DBSCAN runs
+    GRAPH_MAX_EDGES = 20_000_000
+
+    def __init__(self, data: pd.DataFrame, explained_variance, fit_info: dict = None, scores_path: str = None,
+                 components: np.ndarray = None, mean: np.ndarray = None, preprocessor=None,
+                 feature_names: list = None, precision: str = 'float64', explained_variance_all=None,
+                 n_top_features: int = 10, feature_map=None) -> None:
         if not isinstance(data, pd.DataFrame):
             raise TypeError("Input data must be a pandas DataFrame.")
 
         if len(data.columns) < 2:
             raise ValueError("Input DataFrame must have at least two columns.")
 
-        self.df = data.copy()
+        # Scores of an out-of-core PCA stay memory-mapped from the `.npy` file instead of being copied
+        self.scores_path = scores_path
+        # 'float32' keeps the scores, and so the distances computed by clustering, in single precision
+        self.precision = precision
+        self.dtype = np.dtype(precision).type
+        self.df = data.astype(self.dtype) if scores_path is None else data
         self.explained_variance = explained_variance
+        # Explained variance of all components, if the solver computed the full decomposition
+        self.explained_variance_all = explained_variance_all
+        # Solver used, time taken and approximation error of the PCA fit
+        self.fit_info = fit_info
+
+        # Fitted model: preparation of the input data (`transform(df)` returning the design matrix),
+        # then centering with `mean` and projection on `components` (n_components x n_features)
+        self.components = components
+        self.mean = mean
+        self.preprocessor = preprocessor
+        self.feature_names = feature_names
+        # Non-linear mapping of the design matrix before the projection (kernel PCA), with a `transform` method
+        self.feature_map = feature_map
 
         # Rename columns
         columns = [f'pc{i + 1}' for i in range(len(data.columns))]
         self.df.columns = columns
 
+        # Loadings of the original variables (variables x components) and, for every component,
+        # positions of the `n_top_features` variables with the largest absolute loadings, in decreasing order
+        self.n_top_features = n_top_features
+        self.loadings = None
+        self._feature_array = None
+        self._component_index = None
+        if components is not None and feature_names is not None:
+            self.loadings = pd.DataFrame(np.asarray(components).T, index=feature_names, columns=columns)
+            self._feature_array = np.asarray(feature_names, dtype=object)
+            self._component_index = self._top_positions(np.asarray(components))
+
         # Labels after clustering
         self.labels = None
         self.group_features = None
+        # Cluster centroids expressed in the original variables and their top variables index
+        self.cluster_contributions = None
+        self._cluster_index = None
+        # Silhouette scores of the last K-means cluster number suggestion
+        self.silhouette_results = None
+        # Tree index of the scores and sparse graph of distances between rows closer than the radius,
+        # shared by DBSCAN runs with smaller eps
+        self._neighbour_index = None
+        self._radius_graph = None
+        self._graph_radius = 0.0
 
     def get_df(self) -> pd.DataFrame:
         return self.df
 
+    # Variables with the largest loadings on a component
+    def top_features(self, component: str, k: int = 3) -> list:
+        """
+        Gets the original variables that contribute the most to a component (largest absolute loadings).
+
+        Args:
+            component (str): Name of the component (ex. 'pc1').
+            k (int, optional): Number of variables. Defaults to 3.
+
+        Returns:
+            list: Names of the variables, in decreasing order of contribution.
+        """
+        if self.loadings is None:
+            raise ValueError("Loadings of the original variables are not available.")
+        position = self.df.columns.get_loc(component)
+        if k <= self.n_top_features:
+            return self._feature_array[self._component_index[position, :k]].tolist()
+        return self._feature_array[self._top_positions(self.loadings.iloc[:, [position]].to_numpy().T, k)[0]].tolist()
+
+    # Variables that distinguish a cluster
+    def cluster_top_features(self, label: int, k: int = 3) -> list:
+        """
+        Gets the original variables that distinguish a cluster the most: the cluster centroid is projected
+        back onto the variables and the ones furthest from the overall mean are returned.
+
+        Args:
+            label (int): Cluster label.
+            k (int, optional): Number of variables. Defaults to 3.
+
+        Returns:
+            list: Names of the variables, in decreasing order of contribution.
+        """
+        if self.cluster_contributions is None:
+            raise ValueError("Clustering with loadings of the original variables has not been performed.")
+        position = self.cluster_contributions.index.get_loc(label)
+        if k <= self.n_top_features:
+            return self._feature_array[self._cluster_index[position, :k]].tolist()
+        values = self.cluster_contributions.iloc[[position]].to_numpy()
+        return self._feature_array[self._top_positions(values, k)[0]].tolist()
+
+    def _top_positions(self, values: np.ndarray, k: int = None) -> np.ndarray:
+        # Positions of the k largest absolute values of every row, in decreasing order, without a full sort
+        k = min(self.n_top_features if k is None else k, values.shape[1])
+        magnitude = np.abs(values)
+        if k < values.shape[1]:
+            positions = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+        else:
+            positions = np.tile(np.arange(values.shape[1]), (values.shape[0], 1))
+        order = np.argsort(-np.take_along_axis(magnitude, positions, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(positions, order, axis=1)
+
+    def _index_clusters(self, labels: list, centers: np.ndarray) -> None:
+        # Centroids in the principal components are mapped back onto the variables, the top variables of every
+        # cluster become the group features. Without loadings the components themselves are used, as before.
+        if self.loadings is None:
+            self.group_features = {label: list(self.df.columns[center.argsort()[-3:][::-1]])
+                                   for label, center in zip(labels, centers)}
+            return
+        contributions = centers @ self.loadings.to_numpy().T
+        self.cluster_contributions = pd.DataFrame(contributions, index=labels, columns=self.loadings.index)
+        self._cluster_index = self._top_positions(contributions)
+        self.group_features = {label: self._feature_array[self._cluster_index[i, :3]].tolist()
+                               for i, label in enumerate(labels)}
+
+    # Tree index of the scores, built once
+    def _neighbour_search(self) -> NearestNeighbors:
+        if self._neighbour_index is None:
+            self._neighbour_index = NearestNeighbors().fit(self.df.to_numpy())
+        return self._neighbour_index
+
+    # Distance of every row to its k-th nearest row (the row itself included)
+    def _k_distances(self, k: int, chunk_size: int = 10_000) -> np.ndarray:
+        scores = self.df.to_numpy()
+        # With k = 1 every row would be its own neighbour, the nearest other row is used instead
+        n_neighbors = min(max(k, 2), len(scores))
+        distances = np.empty(len(scores))
+        for start in range(0, len(scores), chunk_size):
+            neighbours = self._neighbour_search().kneighbors(scores[start:start + chunk_size], n_neighbors)
+            distances[start:start + chunk_size] = neighbours[0][:, -1]
+        return distances
+
+    # DBSCAN labels, on the shared neighbours graph when it covers eps
+    def _dbscan_labels(self, eps: float, min_samples: int, chunk_size: int = 10_000) -> np.ndarray:
+        graph = self._neighbour_graph(eps, chunk_size)
+        if graph is None:
+            return DBSCAN(eps=eps, min_samples=min_samples).fit_predict(self.df)
+        return DBSCAN(eps=eps, min_samples=min_samples, metric='precomputed').fit_predict(graph)
+
+    # Graph of distances between rows at most `eps` apart
+    def _neighbour_graph(self, eps: float, chunk_size: int = 10_000) -> sparse.csr_matrix:
+        """
+        Returns the sparse graph of distances between rows at most `eps` apart (every row is its own neighbour),
+        for DBSCAN with `metric='precomputed'`. The graph is built once at the largest radius asked for,
+        smaller radii filter the stored graph instead of searching the neighbours again.
+
+        Args:
+            eps (float): Radius of the neighbourhoods.
+            chunk_size (int, optional): Rows queried in the neighbour index at once. Defaults to 10 000.
+
+        Returns:
+            sparse.csr_matrix: Distances (n_samples x n_samples), zero distances are stored explicitly.
+            None if the graph would have more than `GRAPH_MAX_EDGES` distances.
+        """
+        if self._radius_graph is None or eps > self._graph_radius:
+            scores = self.df.to_numpy()
+            index = self._neighbour_search()
+            # Size of the graph estimated from the neighbourhoods of evenly spread rows
+            sample = scores[np.linspace(0, len(scores) - 1, min(len(scores), 1000)).astype(int)]
+            sizes = [len(neighbours) for neighbours in index.radius_neighbors(sample, eps, return_distance=False)]
+            if np.mean(sizes) * len(scores) > self.GRAPH_MAX_EDGES:
+                return None
+            # The smaller graph is released before the larger one is built
+            self._radius_graph = None
+            self._radius_graph = sparse.vstack([
+                index.radius_neighbors_graph(scores[start:start + chunk_size], eps, mode='distance', sort_results=True)
+                for start in range(0, len(scores), chunk_size)
+            ], format='csr')
+            self._graph_radius = eps
+        if eps == self._graph_radius:
+            return self._radius_graph
+
+        # Entries are kept by a mask rather than zeroed, so that distances of duplicate rows (explicit zeros) stay
+        graph = self._radius_graph
+        kept = graph.data <= eps
+        rows = np.repeat(np.arange(graph.shape[0]), np.diff(graph.indptr))
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows[kept], minlength=graph.shape[0]))))
+        return sparse.csr_matrix((graph.data[kept], graph.indices[kept], indptr), shape=graph.shape)
+
+    # Position of the knee of an increasing convex curve
+    @staticmethod
+    def _knee_position(values: np.ndarray, max_points: int = 10_000) -> int:
+        # Point of the curve farthest below the line joining its ends, both axes scaled to [0, 1]
+        positions = np.unique(np.linspace(0, len(values) - 1, min(len(values), max_points)).astype(int))
+        curve = values[positions]
+        span = curve[-1] - curve[0]
+        if span <= 0:
+            return len(values) // 2
+        x = positions / max(len(values) - 1, 1)
+        y = (curve - curve[0]) / span
+        return int(positions[np.argmax(x - y)])
+
+    # Consecutive batches of scores
+    def _iter_batches(self, batch_size: int):
+        scores = self.df.to_numpy()
+        for start in range(0, len(scores), batch_size):
+            # The last rows are merged into the previous batch, mini-batch K-means needs enough rows per batch
+            if 0 < len(scores) - start - batch_size < batch_size // 2:
+                yield np.asarray(scores[start:], dtype=self.dtype)
+                return
+            yield np.asarray(scores[start:start + batch_size], dtype=self.dtype)
+
+    # Project new data
+    def transform(self, new_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Projects new data on the fitted components. The operations executed on the analysed data
+        (type changes, normalization with the original statistics, one-hot encoding with the original
+        categories, ...) are applied first, then the rows are mapped to the kernel features (kernel PCA),
+        centered and multiplied by the components.
+
+        Args:
+            new_df (pd.DataFrame): New data with the variables of the analysed data as they were loaded.
+
+        Returns:
+            pd.DataFrame: Principal component scores of the new rows, indexed like `new_df`
+            (rows with missing values are removed if they were removed from the analysed data).
+        """
+        if self.components is None:
+            raise ValueError("The fitted PCA model is not available.")
+        design = self.preprocessor.transform(new_df) if self.preprocessor is not None else new_df
+        index = design.index
+        design = design.to_numpy(dtype=self.dtype)
+        if self.feature_map is not None:
+            design = self.feature_map.transform(design).astype(self.dtype)
+        if design.shape[1] != self.components.shape[1]:
+            raise ValueError(f"Expected {self.components.shape[1]} variables after preparation, got {design.shape[1]}.")
+        scores = (design - self.mean.astype(self.dtype)) @ self.components.T.astype(self.dtype)
+        return pd.DataFrame(scores, index=index, columns=self.df.columns)
+
+    # Save the fitted model
+    def save(self, filename: str) -> None:
+        """
+        Saves the fitted model (preparation of the data, components, explained variance) to a file.
+        The scores are not saved.
+
+        Args:
+            filename (str): Name of the file.
+        """
+        if self.components is None:
+            raise ValueError("The fitted PCA model is not available.")
+        model = {
+            'format_version': self.MODEL_FORMAT_VERSION,
+            'columns': list(self.df.columns),
+            'explained_variance': np.asarray(self.explained_variance),
+            'explained_variance_all': self.explained_variance_all,
+            'fit_info': self.fit_info,
+            'components': self.components,
+            'mean': self.mean,
+            'preprocessor': self.preprocessor,
+            'feature_names': self.feature_names,
+            'precision': self.precision,
+            'feature_map': self.feature_map,
+        }
+        with open(filename, 'wb') as model_file:
+            pickle.dump(model, model_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Load a fitted model
+    @classmethod
+    def load(cls, filename: str) -> 'PCAHandler':
+        """
+        Loads a model saved with `save`. The returned PCAHandler has no scores, new data is projected
+        with `transform`. The file is unpickled, only load files from a trusted source.
+
+        Args:
+            filename (str): Name of the file.
+
+        Returns:
+            PCAHandler: PCAHandler object with the fitted model.
+        """
+        with open(filename, 'rb') as model_file:
+            model = pickle.load(model_file)
+        if not isinstance(model, dict) or model.get('format_version') != cls.MODEL_FORMAT_VERSION:
+            raise ValueError("Unsupported PCA model file.")
+        return cls(pd.DataFrame(columns=model['columns'], dtype=np.float64),
+                   explained_variance=model['explained_variance'], fit_info=model['fit_info'],
+                   components=model['components'], mean=model['mean'], preprocessor=model['preprocessor'],
+                   feature_names=model['feature_names'], precision=model.get('precision', 'float64'),
+                   explained_variance_all=model.get('explained_variance_all'), feature_map=model.get('feature_map'))
+
     def plot_2d(self, x_component: str, y_component: str, title: str = None) -> plt:
         """
         Generates a 2D scatter plot.
@@ -76,23 +377,27 @@ class PCAHandler:
 
     
     # Explained variance plot
-    def plot_explained_variance(self, cumulative: bool=True):
+    def plot_explained_variance(self, cumulative: bool=True, all_components: bool = False):
         """
         Plot explained variance ratio.
 
         Args:
             cumulative (bool): True: Shows the graph of Cumulative Explained Variance. False: Shows just the graph of Explained Variance. Defaults to True.
+            all_components (bool): Show all components, not only the kept ones, if the full decomposition is available. Defaults to False.
 
         Returns:
             plt: Matplotlib plot object.
         """
-        num_components = len(self.explained_variance)
+        explained_variance = self.explained_variance
+        if all_components and self.explained_variance_all is not None:
+            explained_variance = self.explained_variance_all
+        num_components = len(explained_variance)
         plt.figure(figsize=(8, 6))
         if cumulative:
-            plt.plot(np.cumsum(self.explained_variance), marker='o') 
+            plt.plot(np.cumsum(explained_variance), marker='o') 
             plt.title('Cumulative Explained Variance Ratio for Principal Components')
         else:
-            plt.plot(self.explained_variance, marker='o') 
+            plt.plot(explained_variance, marker='o') 
             plt.title('Explained Variance Ratio for Principal Components')
         plt.xlabel('Principal Component')
         plt.ylabel('Explained Variance Ratio')
@@ -180,27 +485,56 @@ class PCAHandler:
     #     plt.show()
 
     # K-means clustering
-    def kmeans_clustering(self, num_clusters: int) -> None:
+    def kmeans_clustering(self, num_clusters: int, mini_batch: bool = None, batch_size: int = 10_000,
+                          batches=None, n_epochs: int = 1, chunk_size: int = 100_000, random_state: int = None) -> None:
         """
         Performs K-means clustering on the data.
 
+        In the mini-batch mode the centroids are updated with consecutive batches of scores, so the scores
+        are never used as a whole (memory-mapped scores of an out-of-core PCA are read batch by batch),
+        and the labels are then assigned chunk by chunk.
+
         Args:
             num_clusters (int): Number of clusters to form.
+            mini_batch (bool, optional): Use mini-batch K-means. Defaults to None, which uses it for memory-mapped
+                scores and for at least `MINI_BATCH_MIN_ROWS` rows.
+            batch_size (int, optional): Rows of a mini-batch. Defaults to 10 000.
+            batches (iterable, optional): Batches of scores (arrays of rows x components) to fit the centroids on
+                instead of the scores of this object, e.g. produced batch by batch by an out-of-core projection.
+                Implies the mini-batch mode. Defaults to None.
+            n_epochs (int, optional): Passes over the scores of this object in the mini-batch mode. Defaults to 1.
+            chunk_size (int, optional): Rows labelled at once in the mini-batch mode. Defaults to 100 000.
+            random_state (int, optional): Seed of the centroid initialization. Defaults to None.
         """
         if num_clusters <= 0:
             raise ValueError("Number of clusters must be greater than zero.")
+        if mini_batch is None:
+            mini_batch = batches is not None or self.scores_path is not None or len(self.df) >= self.MINI_BATCH_MIN_ROWS
 
-        kmeans = KMeans(n_clusters=num_clusters, n_init='auto')
-        self.labels = kmeans.fit_predict(self.df)
-
-        cluster_centers = kmeans.cluster_centers_
-
-        feature_names = self.df.columns
-        self.group_features = {}
-
-        for i, center in enumerate(cluster_centers):
-            group_features_indices = center.argsort()[-3:][::-1]  # top 3 features for each group
-            self.group_features[i] = [feature_names[idx] for idx in group_features_indices]
+        if not mini_batch and batches is None:
+            kmeans = KMeans(n_clusters=num_clusters, n_init='auto', random_state=random_state)
+            self.labels = kmeans.fit_predict(self.df)
+        else:
+            if batch_size < num_clusters:
+                raise ValueError("Batch size must not be smaller than the number of clusters.")
+            kmeans = MiniBatchKMeans(n_clusters=num_clusters, batch_size=batch_size, n_init='auto',
+                                     random_state=random_state)
+            if batches is None:
+                batches = (batch for _ in range(n_epochs) for batch in self._iter_batches(batch_size))
+            for batch in batches:
+                kmeans.partial_fit(np.asarray(batch, dtype=self.dtype))
+            if not hasattr(kmeans, 'cluster_centers_'):
+                raise ValueError("No batch of scores was given.")
+
+            labels = np.empty(len(self.df), dtype=np.int32)
+            start = 0
+            for batch in self._iter_batches(chunk_size):
+                labels[start:start + len(batch)] = kmeans.predict(batch)
+                start += len(batch)
+            self.labels = labels
+
+        # top 3 features for each group
+        self._index_clusters(list(range(num_clusters)), kmeans.cluster_centers_)
 
 
     # DBSCAN clustering
@@ -217,31 +551,39 @@ class PCAHandler:
         if min_samples <= 0:
             raise ValueError("Minimum number of samples must be greater than zero.")
 
-        dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-        self.labels = dbscan.fit_predict(self.df)
+        self.labels = self._dbscan_labels(eps, min_samples)
 
-        unique_labels = np.unique(self.labels)
-        self.group_features = {}
+        # Centers of all clusters at once, noise points are ignored
+        clustered = self.labels >= 0
+        labels, inverse = np.unique(self.labels[clustered], return_inverse=True)
+        scores = self.df.to_numpy()[clustered]
+        sums = np.zeros((len(labels), scores.shape[1]))
+        np.add.at(sums, inverse, scores)
+        centers = sums / np.bincount(inverse, minlength=len(labels))[:, np.newaxis]
 
-        for label in unique_labels:
-            if label == -1:
-                continue  # ignore noise points
-            group_indices = np.where(self.labels == label)[0]
-            group_data = self.df.iloc[group_indices]
-            group_center = np.mean(group_data, axis=0)
-            group_features_indices = group_center.argsort()[-3:][::-1]  # top 3 features for each group
-            self.group_features[label] = list(self.df.columns[group_features_indices])
+        # top 3 features for each group
+        self._index_clusters(labels.tolist(), centers)
 
 
 
 
-    def suggest_clusters_kmeans(self, max_clusters: int = 10, draw_graph: bool = False) -> int:
+    def suggest_clusters_kmeans(self, max_clusters: int = 10, draw_graph: bool = False, max_workers: int = None,
+                                callback=None, random_state: int = None, silhouette: str = 'auto') -> int:
         """
         Suggests the optimal number of clusters using silhouette score for K-means clustering.
+        Numbers of clusters are tried in parallel in a process pool, the scores are shared with the workers
+        through shared memory instead of being sent with every task.
 
         Args:
             max_clusters (int): Maximum number of clusters to consider.
             draw_graph (bool):  Draw plot of silhouette scores for test purposes.
+            max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            callback (callable, optional): Called with the number of clusters and its silhouette score
+                as soon as it is computed (in the order of completion).
+            random_state (int, optional): Seed of K-means and of the silhouette sample. Defaults to None.
+            silhouette (str, optional): Silhouette mode, one of `SilhouetteScorer.MODES`. Defaults to 'auto'
+                (exact for small data, estimated on a sample or from centroids for large data).
+                Scores of all candidates are kept in `silhouette_results`.
 
         Returns:
             int: Optimal number of clusters.
@@ -249,12 +591,21 @@ class PCAHandler:
         if max_clusters <= 1:
             raise ValueError("Max clusters must be greater than 1.")
 
-        silhouette_scores = []
-        for i in range(2, max_clusters + 1):  # Start from 2 clusters for silhouette score
-            kmeans = KMeans(n_clusters=i, n_init='auto')
-            cluster_labels = kmeans.fit_predict(self.df)
-            silhouette_avg = silhouette_score(self.df, cluster_labels)
-            silhouette_scores.append(silhouette_avg)
+        scorer = SilhouetteScorer(silhouette, random_state=random_state)
+        candidates = range(2, max_clusters + 1)  # Start from 2 clusters for silhouette score
+        results = {}
+        with SharedArray.from_array(np.ascontiguousarray(self.df.to_numpy())) as shared:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_sweep_worker,
+                                     initargs=(shared.spec,)) as executor:
+                # Larger numbers of clusters take longer, they are started first
+                futures = [executor.submit(_score_kmeans, i, random_state, scorer) for i in reversed(candidates)]
+                for future in as_completed(futures):
+                    num_clusters, result = future.result()
+                    results[num_clusters] = result
+                    if callback is not None:
+                        callback(num_clusters, result['score'])
+        self.silhouette_results = pd.DataFrame([results[i] for i in candidates], index=candidates)
+        silhouette_scores = self.silhouette_results['score'].to_numpy()
 
         optimal_cluster_index = np.argmax(silhouette_scores) + 2
 
@@ -269,13 +620,21 @@ class PCAHandler:
 
 
     # DBSCAN cluster suggestion using silhouette score
-    def suggest_clusters_dbscan(self, min_samples: int, draw_graph: bool = False) -> float:
+    def suggest_clusters_dbscan(self, min_samples: int, draw_graph: bool = False, silhouette: str = 'auto',
+                                random_state: int = None, chunk_size: int = 10_000) -> float:
         """
         Suggests the optimal value of epsilon (eps) for DBSCAN clustering using silhouette score.
 
+        Candidates for eps are spread around the knee of the sorted k-distance curve (distance of every row to its
+        `min_samples`-th nearest row, counting the row itself, i.e. the smallest eps making the row a core point).
+        The distances are found with a tree index chunk by chunk, without the full distance matrix.
+
         Args:
             min_samples (int): The number of samples in a neighborhood for a point to be considered as a core point.
             draw_graph (bool): Draw plot of silhouette scores for test purposes.
+            silhouette (str, optional): Silhouette mode, one of `SilhouetteScorer.MODES`. Defaults to 'auto'.
+            random_state (int, optional): Seed of the silhouette sample. Defaults to None.
+            chunk_size (int, optional): Rows queried in the neighbour index at once. Defaults to 10 000.
 
         Returns:
             float: Optimal value of epsilon.
@@ -283,17 +642,23 @@ class PCAHandler:
         if min_samples <= 0:
             raise ValueError("Minimum number of samples must be greater than zero.")
 
+        scorer = SilhouetteScorer(silhouette, random_state=random_state)
         silhouette_scores = []
-        # Choose range of epsilon values as percentage of max distance
-        distance_matrix = pairwise_distances(self.df)
-        max_distance = np.max(distance_matrix)
-        eps_values = np.linspace(0.1 * max_distance, 0.9 * max_distance, 5)
-
+        # Choose range of epsilon values around the knee of the k-distance curve
+        k_distances = np.sort(self._k_distances(min_samples, chunk_size))
+        knee = k_distances[self._knee_position(k_distances)]
+        if knee <= 0:
+            knee = k_distances[k_distances > 0].min() if np.any(k_distances > 0) else 1.0
+        eps_values = knee * np.array([0.5, 0.75, 1.0, 1.5, 2.0])
+
+        # One neighbour search at the largest eps whose graph fits, smaller candidates filter that graph
+        for eps in eps_values[::-1]:
+            if self._neighbour_graph(eps, chunk_size) is not None:
+                break
         for eps in eps_values:
-            dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-            cluster_labels = dbscan.fit_predict(self.df)
+            cluster_labels = self._dbscan_labels(eps, min_samples, chunk_size)
             if len(np.unique(cluster_labels)) > 1:
-                silhouette_avg = silhouette_score(self.df, cluster_labels)
+                silhouette_avg = scorer.score(self.df, cluster_labels)
                 silhouette_scores.append(silhouette_avg)
             else:
                 silhouette_scores.append(-1)
@@ -0,0 +1,549 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import LinearOperator, svds
+from scipy.special import gammaln
+from threadpoolctl import threadpool_limits
+
+
+class PCASolver:
+    """
+    Computes the leading principal components of a design matrix made of a dense part
+    and an optional sparse block, with a choice of the SVD solver:
+
+    - 'full': exact SVD of the whole centered matrix (LAPACK),
+    - 'randomized': randomized range finder with power iterations (Halko et al.),
+      the cost grows with the number of components instead of the number of variables,
+    - 'arpack': truncated SVD with Lanczos iterations (ARPACK), exact to the solver tolerance,
+    - 'covariance': full eigendecomposition of the covariance matrix (or of the Gram matrix if there are
+      more variables than rows). The decomposition (see `decompose`) can be passed to `fit` again,
+      then any number of components is a slice of it and only the scores are computed.
+      For tall data, `fit_blocks` computes it from blocks of rows in a thread pool,
+    - 'auto': chosen from the shape of the data and the number of components (see `choose`).
+
+    'randomized' and 'arpack' never center or densify the data, centering is applied implicitly.
+    After `fit`, the solver keeps the components, the mean and a `fit_info` report with the solver used,
+    the time taken and the approximation error.
+
+    With `dtype=np.float32` the decomposition runs in single precision, only the mean and the total
+    variance are accumulated in double precision.
+    """
+
+    SOLVERS = ('auto', 'full', 'randomized', 'arpack', 'covariance')
+
+    # Largest covariance or Gram matrix 'auto' decomposes
+    COVARIANCE_MAX_SIZE = 1000
+
+    def __init__(self, svd_solver: str = 'auto', random_state: int = None, n_oversamples: int = 10,
+                 n_iter: int = 4, dtype=np.float64, chunk_size: int = 10_000, n_jobs: int = None,
+                 min_components: int = 1) -> None:
+        if svd_solver not in self.SOLVERS:
+            raise ValueError(f"Unknown SVD solver '{svd_solver}'. Available solvers: {', '.join(self.SOLVERS)}.")
+        self.svd_solver = svd_solver
+        self.random_state = random_state
+        self.n_oversamples = n_oversamples  # additional random vectors of the randomized solver
+        self.n_iter = n_iter  # power iterations of the randomized solver
+        self.dtype = dtype
+        self.chunk_size = chunk_size  # rows per block when accumulating the covariance matrix
+        self.min_components = min_components  # fewest components chosen for a target variance or by 'mle'
+        self.n_jobs = n_jobs if n_jobs is not None else os.cpu_count() or 1  # threads of the blocked computation
+
+        self.decomposition = None
+        self.components = None
+        self.mean = None
+        self.singular_values = None
+        self.explained_variance = None
+        self.fit_info = None
+
+    # Choose a solver for the data shape
+    def choose(self, n_samples: int, n_features: int, n_components: int, sparse: bool = False) -> str:
+        """
+        Chooses the solver used by 'auto':
+
+        - at most 1000 rows or variables (`COVARIANCE_MAX_SIZE`): 'covariance', the decomposition is small
+          and can be kept for other numbers of components,
+        - many components (at least 80% of the rank): 'full',
+        - 'mle' as the number of components: 'covariance', the estimate needs the whole spectrum,
+        - data with a sparse block and fewer than 10 components: 'arpack',
+        - otherwise: 'randomized'.
+
+        Args:
+            n_samples (int): Number of rows.
+            n_features (int): Number of variables, including the sparse ones.
+            n_components (int, float or str): Number of components, fraction of the variance or 'mle'.
+            sparse (bool, optional): The data has a sparse block. Defaults to False.
+
+        Returns:
+            str: Name of the solver.
+        """
+        if self.svd_solver != 'auto':
+            return self.svd_solver
+        rank = min(n_samples, n_features)
+        if rank <= self.COVARIANCE_MAX_SIZE or n_components == 'mle':
+            return 'covariance'
+        if self._is_count(n_components) and n_components >= 0.8 * rank:
+            return 'full'
+        if sparse and (not self._is_count(n_components) or n_components < 10):
+            return 'arpack'
+        return 'randomized'
+
+    # Fit the components
+    def fit(self, dense: np.ndarray, block: sp.csr_matrix = None, n_components=2,
+            decomposition: dict = None) -> np.ndarray:
+        """
+        Computes the leading principal components.
+
+        The number of components can be given directly, as the cumulative explained variance to reach
+        (ex. 0.95) or as 'mle' (Minka's maximum likelihood estimate). A target variance is reached
+        without computing all components: 'randomized' and 'arpack' compute a few components and double
+        their number until the target is reached. 'mle' needs the whole spectrum, so it is only available
+        with the 'full' and 'covariance' solvers ('auto' chooses 'covariance').
+
+        Args:
+            dense (np.ndarray): Dense part of the design matrix (n_samples x n_dense).
+            block (sp.csr_matrix, optional): Sparse part of the design matrix, rows aligned with `dense`.
+            n_components (int, float or str, optional): Number of components, fraction of the variance
+                to explain (0 - 1) or 'mle'. Defaults to 2.
+            decomposition (dict, optional): Result of `decompose` for the same data, reused by the
+                'covariance' solver instead of decomposing the data again.
+
+        Returns:
+            np.ndarray: Principal component scores (n_samples x n_components).
+        """
+        dense = np.asarray(dense, dtype=self.dtype)
+        if block is not None:
+            block = block.astype(self.dtype)
+        self._check_finite(dense, block)
+        n_samples = dense.shape[0]
+        n_features = dense.shape[1] + (0 if block is None else block.shape[1])
+        rank = min(n_samples, n_features)
+        solver = self.choose(n_samples, n_features, n_components, sparse=block is not None)
+
+        max_components = rank if solver in ('full', 'covariance') else rank - 1
+        target = self._check_n_components(n_components, solver, max_components, n_samples, n_features)
+
+        mean, matmat, rmatmat = self._centered_operator(dense, block)
+        start = time.perf_counter()
+        cached = solver == 'covariance' and decomposition is not None
+        if solver == 'covariance':
+            if decomposition is None:
+                decomposition = self._eigendecomposition(dense, block, mean)
+            self.decomposition = decomposition
+            total_variance = decomposition['total_variance']
+            if target is not None:
+                n_components = self._select_components(decomposition['eigenvalues'] / (n_samples - 1),
+                                                       total_variance, target, n_samples)
+            u, s, vt = self._from_eigendecomposition(decomposition, matmat, rmatmat, n_components)
+        elif solver == 'full':
+            total_variance = self._total_variance(dense, block, mean)
+            full = dense if block is None else np.hstack([dense, block.toarray()])
+            u, s, vt = np.linalg.svd(full - mean, full_matrices=False)
+            if target is not None:
+                n_components = self._select_components(s.astype(np.float64) ** 2 / (n_samples - 1),
+                                                       total_variance, target, n_samples)
+            u, s, vt = u[:, :n_components], s[:n_components], vt[:n_components]
+        else:
+            total_variance = self._total_variance(dense, block, mean)
+            n_computed = n_components if target is None else min(max(10, 2 * self.min_components), max_components)
+            while True:
+                u, s, vt = self._truncated_svd(solver, matmat, rmatmat, (n_samples, n_features), n_computed)
+                if target is None:
+                    break
+                variances = s.astype(np.float64) ** 2 / (n_samples - 1)
+                if variances.sum() >= target * total_variance or n_computed == max_components:
+                    order = np.argsort(s)[::-1]
+                    n_components = self._select_components(variances[order], total_variance, target, n_samples)
+                    u, s, vt = u[:, order[:n_components]], s[order[:n_components]], vt[order[:n_components]]
+                    break
+                # Not enough variance explained yet, twice as many components are computed
+                n_computed = min(2 * n_computed, max_components)
+        elapsed = time.perf_counter() - start
+
+        order = np.argsort(s)[::-1]
+        u, s, vt = u[:, order], s[order], vt[order]
+        # Deterministic signs for every solver, the largest entry of each component is positive
+        signs = np.sign(u[np.argmax(np.abs(u), axis=0), range(u.shape[1])])
+        signs[signs == 0] = 1
+        u *= signs
+        vt *= signs[:, np.newaxis]
+        scores = u * s
+
+        if solver == 'covariance':
+            max_residual = float(np.max(decomposition['residuals'][:n_components]))
+        else:
+            max_residual = self._max_residual(matmat, rmatmat, vt, s)
+        self._store_fit(solver, vt, s, mean, n_samples, total_variance, elapsed, cached, max_residual)
+        return scores
+
+    # Fit the components of tall data read in blocks of rows
+    def fit_blocks(self, read_rows, n_samples: int, n_features: int, n_components=2,
+                   decomposition: dict = None) -> np.ndarray:
+        """
+        Computes the leading principal components with the 'covariance' solver without building
+        the design matrix. Rows are read in blocks of `chunk_size` rows by `n_jobs` threads, every thread
+        accumulates the mean and the centered cross-products of its blocks, the partial results are merged
+        and only the small covariance matrix is decomposed. The scores are computed in a second pass.
+        Memory is bounded by the blocks being processed and the covariance matrix.
+
+        Args:
+            read_rows (callable): Called with `(start, stop)`, returns these rows of the design matrix
+                as a dense array (stop - start x n_features).
+            n_samples (int): Number of rows.
+            n_features (int): Number of variables.
+            n_components (int, float or str, optional): Number of components, fraction of the variance
+                to explain (0 - 1) or 'mle' (see `fit`). Defaults to 2.
+            decomposition (dict, optional): Result of `decompose` or `decompose_blocks` for the same data.
+
+        Returns:
+            np.ndarray: Principal component scores (n_samples x n_components).
+        """
+        if n_features > n_samples:
+            raise ValueError("Blocked computation needs at least as many rows as variables.")
+        target = self._check_n_components(n_components, 'covariance', n_features, n_samples, n_features)
+
+        start = time.perf_counter()
+        cached = decomposition is not None
+        if decomposition is None:
+            decomposition = self.decompose_blocks(read_rows, n_samples, n_features)
+        self.decomposition = decomposition
+        if target is not None:
+            n_components = self._select_components(decomposition['eigenvalues'] / (n_samples - 1),
+                                                   decomposition['total_variance'], target, n_samples)
+        s = np.sqrt(decomposition['eigenvalues'][:n_components])
+        vt = decomposition['eigenvectors'][:, :n_components].T.copy()
+        scores = self._blocked_scores(read_rows, n_samples, decomposition['mean'], vt.T)
+        elapsed = time.perf_counter() - start
+
+        # The same signs as `fit`, the scores are the left singular vectors scaled by positive values
+        signs = np.sign(scores[np.argmax(np.abs(scores), axis=0), range(n_components)])
+        signs[signs == 0] = 1
+        scores *= signs
+        vt *= signs[:, np.newaxis]
+
+        self._store_fit('covariance', vt, s, decomposition['mean'], n_samples, decomposition['total_variance'],
+                        elapsed, cached, float(np.max(decomposition['residuals'][:n_components])))
+        return scores
+
+    # Full eigendecomposition of the covariance matrix of tall data read in blocks of rows
+    def decompose_blocks(self, read_rows, n_samples: int, n_features: int) -> dict:
+        """
+        Computes the full eigendecomposition used by the 'covariance' solver from blocks of rows
+        (see `fit_blocks`).
+
+        Args:
+            read_rows (callable): Called with `(start, stop)`, returns these rows of the design matrix.
+            n_samples (int): Number of rows.
+            n_features (int): Number of variables.
+
+        Returns:
+            dict: Decomposition, its 'explained_variance' holds the explained variance ratios of all components.
+        """
+        mean, matrix = self._blocked_covariance(read_rows, n_samples, n_features)
+        self.decomposition = self._decompose_matrix(matrix, 'covariance', n_samples, mean)
+        return self.decomposition
+
+    # Reject missing and infinite values before they reach LAPACK
+    @staticmethod
+    def _check_finite(dense: np.ndarray, block: sp.csr_matrix = None) -> None:
+        # A sum is finite exactly when all values are, unless it overflows; the slow check then decides
+        with np.errstate(over='ignore', invalid='ignore'):
+            if np.isfinite(np.sum(dense, dtype=np.float64)) and (block is None or np.isfinite(np.sum(block.data))):
+                return
+        positions = np.flatnonzero(~np.isfinite(dense).all(axis=0)).tolist()
+        if block is not None:
+            invalid = block.indices[~np.isfinite(block.data)]
+            positions += sorted(set((dense.shape[1] + invalid).tolist()))
+        if positions:
+            raise ValueError(f"Input contains NaN or infinite values (variables at positions {positions[:10]}). "
+                             "Remove the rows with missing values or fill them in before PCA.")
+
+    def _store_fit(self, solver: str, vt: np.ndarray, s: np.ndarray, mean: np.ndarray, n_samples: int,
+                   total_variance: float, elapsed: float, cached: bool, max_residual: float) -> None:
+        self.components = vt
+        self.mean = mean
+        self.singular_values = s
+        self.explained_variance = (s.astype(np.float64) ** 2) / (n_samples - 1) / total_variance
+        self.fit_info = {
+            'svd_solver': solver,
+            'time': elapsed,
+            'cached': cached,  # the covariance decomposition of an earlier fit was reused
+            # Relative Frobenius norm of the part of the centered data the components do not explain
+            'reconstruction_error': float(np.sqrt(max(0.0, 1.0 - self.explained_variance.sum()))),
+            # Largest relative residual ||C v - lambda v|| / lambda of the covariance eigenpairs
+            'max_residual': max_residual,
+        }
+
+    # Blocks of rows split between the threads
+    def _partition(self, n_samples: int) -> list:
+        starts = list(range(0, n_samples, self.chunk_size))
+        n_workers = max(1, min(self.n_jobs, len(starts)))
+        return [[(start, min(start + self.chunk_size, n_samples)) for start in starts[worker::n_workers]]
+                for worker in range(n_workers)]
+
+    def _run_blocks(self, work, partition: list) -> list:
+        if len(partition) == 1:
+            return [work(partition[0])]
+        # One BLAS thread per worker, the threads already use all cores
+        with threadpool_limits(limits=1, user_api='blas'), ThreadPoolExecutor(max_workers=len(partition)) as executor:
+            return list(executor.map(work, partition))
+
+    def _blocked_covariance(self, read_rows, n_samples: int, n_features: int) -> tuple:
+        # Partial means and centered cross-products are merged pairwise (Chan et al.), one pass over the data
+        def merge(first, second):
+            count_a, mean_a, product_a = first
+            count_b, mean_b, product_b = second
+            if count_a == 0:
+                return second
+            count = count_a + count_b
+            delta = mean_b - mean_a
+            mean = mean_a + delta * (count_b / count)
+            product = product_a + product_b + np.outer(delta, delta) * (count_a * count_b / count)
+            return count, mean, product
+
+        def work(blocks):
+            partial = (0, np.zeros(n_features), np.zeros((n_features, n_features)))
+            for start, stop in blocks:
+                rows = np.asarray(read_rows(start, stop), dtype=self.dtype)
+                self._check_finite(rows)
+                block_mean = rows.mean(axis=0, dtype=np.float64)
+                centered = rows - block_mean.astype(self.dtype)
+                partial = merge(partial, (len(rows), block_mean, (centered.T @ centered).astype(np.float64)))
+            return partial
+
+        total = (0, np.zeros(n_features), np.zeros((n_features, n_features)))
+        for partial in self._run_blocks(work, self._partition(n_samples)):
+            total = merge(total, partial)
+        _, mean, product = total
+        return mean.astype(self.dtype), product.astype(self.dtype)
+
+    def _blocked_scores(self, read_rows, n_samples: int, mean: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        scores = np.empty((n_samples, vectors.shape[1]), dtype=self.dtype)
+
+        def work(blocks):
+            for start, stop in blocks:
+                rows = np.asarray(read_rows(start, stop), dtype=self.dtype)
+                scores[start:stop] = (rows - mean) @ vectors
+
+        self._run_blocks(work, self._partition(n_samples))
+        return scores
+
+    # Full eigendecomposition of the covariance or Gram matrix
+    def decompose(self, dense: np.ndarray, block: sp.csr_matrix = None) -> dict:
+        """
+        Computes the full eigendecomposition used by the 'covariance' solver.
+
+        Args:
+            dense (np.ndarray): Dense part of the design matrix (n_samples x n_dense).
+            block (sp.csr_matrix, optional): Sparse part of the design matrix, rows aligned with `dense`.
+
+        Returns:
+            dict: Decomposition, its 'explained_variance' holds the explained variance ratios of all components.
+        """
+        dense = np.asarray(dense, dtype=self.dtype)
+        if block is not None:
+            block = block.astype(self.dtype)
+        self._check_finite(dense, block)
+        mean, _, _ = self._centered_operator(dense, block)
+        self.decomposition = self._eigendecomposition(dense, block, mean)
+        return self.decomposition
+
+    def _eigendecomposition(self, dense: np.ndarray, block: sp.csr_matrix, mean: np.ndarray) -> dict:
+        n_samples, n_dense = dense.shape
+        n_features = n_dense + (0 if block is None else block.shape[1])
+        if n_features <= n_samples:
+            # Covariance matrix accumulated over blocks of rows, the data is never centered as a whole
+            def read_rows(start, stop):
+                if block is None:
+                    return dense[start:stop]
+                return np.hstack([dense[start:stop], block[start:stop].toarray()])
+
+            method = 'covariance'
+            _, matrix = self._blocked_covariance(read_rows, n_samples, n_features)
+        else:
+            # Gram matrix of the centered rows: X X^T - (X m) 1^T - 1 (X m)^T + m^T m
+            method = 'gram'
+            matrix = dense @ dense.T
+            projected = dense @ mean[:n_dense]
+            if block is not None:
+                matrix += (block @ block.T).toarray()
+                projected += block @ mean[n_dense:]
+            matrix -= projected[:, np.newaxis]
+            matrix -= projected[np.newaxis, :]
+            matrix += mean @ mean
+        return self._decompose_matrix(matrix, method, n_samples, mean)
+
+    def _decompose_matrix(self, matrix: np.ndarray, method: str, n_samples: int, mean: np.ndarray) -> dict:
+        if not np.all(np.isfinite(matrix)):
+            raise ValueError("The covariance of the input overflows, the values are too large. "
+                             "Standardize the variables before PCA.")
+        total_variance = float(np.trace(matrix, dtype=np.float64)) / (n_samples - 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(matrix)
+        order = np.argsort(eigenvalues)[::-1]
+        eigenvalues = np.clip(eigenvalues[order], 0, None)  # rounding can make the smallest ones negative
+        eigenvectors = eigenvectors[:, order]
+        residuals = np.linalg.norm(matrix @ eigenvectors - eigenvectors * eigenvalues, axis=0)
+        residuals = np.divide(residuals, eigenvalues, out=np.zeros(len(eigenvalues)), where=eigenvalues > 0)
+        return {
+            'method': method,
+            'mean': mean,
+            'eigenvalues': eigenvalues,
+            'eigenvectors': eigenvectors,
+            'residuals': residuals,  # relative residuals ||M v - lambda v|| / lambda of the eigenpairs
+            'total_variance': total_variance,
+            'explained_variance': eigenvalues.astype(np.float64) / (n_samples - 1) / total_variance
+            if total_variance > 0 else np.zeros(len(eigenvalues)),
+        }
+
+    def _from_eigendecomposition(self, decomposition: dict, matmat, rmatmat, n_components: int) -> tuple:
+        s = np.sqrt(decomposition['eigenvalues'][:n_components])
+        vectors = decomposition['eigenvectors'][:, :n_components]
+        divisor = np.where(s > 0, s, 1)
+        if decomposition['method'] == 'covariance':
+            # Eigenvectors of the covariance matrix are the components, the scores need one product with the data
+            vt = vectors.T
+            u = matmat(vectors) / divisor
+        else:
+            # Eigenvectors of the Gram matrix are the normalized scores, the components need one product
+            u = vectors
+            vt = rmatmat(u).T / divisor[:, np.newaxis]
+        return u, s, vt
+
+    def _centered_operator(self, dense: np.ndarray, block: sp.csr_matrix) -> tuple:
+        # Products with the centered matrix, computed without centering the data
+        n_dense = dense.shape[1]
+        if block is None:
+            mean = dense.mean(axis=0, dtype=np.float64).astype(dense.dtype)
+
+            def matmat(v):
+                return dense @ v - mean @ v
+
+            def rmatmat(x):
+                return dense.T @ x - np.outer(mean, x.sum(axis=0))
+        else:
+            mean = np.concatenate([dense.mean(axis=0, dtype=np.float64),
+                                   np.asarray(block.mean(axis=0, dtype=np.float64)).ravel()]).astype(dense.dtype)
+
+            def matmat(v):
+                return dense @ v[:n_dense] + block @ v[n_dense:] - mean @ v
+
+            def rmatmat(x):
+                return np.vstack([dense.T @ x, block.T @ x]) - np.outer(mean, x.sum(axis=0))
+        return mean, matmat, rmatmat
+
+    def _truncated_svd(self, solver: str, matmat, rmatmat, shape: tuple, n_components: int) -> tuple:
+        if solver == 'randomized':
+            return self._randomized_svd(matmat, rmatmat, shape, n_components)
+        operator = LinearOperator(shape, dtype=self.dtype,
+                                  matvec=lambda v: matmat(v.reshape(-1, 1)).ravel(),
+                                  rmatvec=lambda x: rmatmat(x.reshape(-1, 1)).ravel(),
+                                  matmat=matmat, rmatmat=rmatmat)
+        return svds(operator, k=n_components, random_state=self.random_state)
+
+    def _is_count(self, n_components) -> bool:
+        return isinstance(n_components, (int, np.integer)) and not isinstance(n_components, bool)
+
+    def _check_n_components(self, n_components, solver: str, max_components: int, n_samples: int,
+                            n_features: int):
+        # Returns None for a number of components, the target otherwise
+        if self._is_count(n_components):
+            if not 0 < n_components <= max_components:
+                raise ValueError(f"Number of components must be between 1 and {max_components} "
+                                 f"for the '{solver}' solver.")
+            return None
+        if n_components == 'mle':
+            if solver not in ('full', 'covariance'):
+                raise ValueError("'mle' needs the whole spectrum, use the 'full' or 'covariance' solver.")
+            if n_samples < n_features:
+                raise ValueError("'mle' needs at least as many rows as variables.")
+            return 'mle'
+        if isinstance(n_components, (float, np.floating)) and 0 < n_components < 1:
+            return float(n_components)
+        raise ValueError("Number of components must be a positive integer, a fraction of the variance "
+                         "between 0 and 1 or 'mle'.")
+
+    # Number of components reaching a target
+    def _select_components(self, variances: np.ndarray, total_variance: float, target, n_samples: int) -> int:
+        """
+        Chooses the number of components from the variances of the leading components.
+
+        Args:
+            variances (np.ndarray): Variances of the computed components, in decreasing order.
+            total_variance (float): Total variance of the data.
+            target (float or str): Fraction of the variance to explain or 'mle'.
+            n_samples (int): Number of rows.
+
+        Returns:
+            int: Number of components, at least `min_components`.
+        """
+        if target == 'mle':
+            n_components = self._mle_components(np.asarray(variances, dtype=np.float64), n_samples)
+        else:
+            cumulative = np.cumsum(variances) / total_variance
+            # Tolerance for the rounding of the cumulative sum, ex. a target of 1.0 - 1e-17
+            n_components = int(np.searchsorted(cumulative, target - 1e-12)) + 1
+        return int(min(max(n_components, self.min_components), len(variances)))
+
+    def _mle_components(self, spectrum: np.ndarray, n_samples: int) -> int:
+        # Minka's Laplace approximation of the evidence (Minka, 2000), as in sklearn's PCA(n_components='mle'),
+        # evaluated for all ranks at once with cumulative sums instead of a loop over pairs of eigenvalues
+        n_features = len(spectrum)
+        if n_features < 2:
+            return n_features
+        eps = 1e-15
+        ranks = np.arange(1, n_features)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pu = -ranks * np.log(2.0) + np.cumsum(gammaln((n_features - ranks + 1) / 2.0)
+                                                  - np.log(np.pi) * (n_features - ranks + 1) / 2.0)
+            pl = -np.cumsum(np.log(spectrum[:-1])) * n_samples / 2.0
+            tail = np.cumsum(spectrum[::-1])[::-1][1:]  # sum of the eigenvalues from `rank` on
+            v = np.maximum(eps, tail / (n_features - ranks))
+            pv = -np.log(v) * n_samples * (n_features - ranks) / 2.0
+            m = n_features * ranks - ranks * (ranks + 1.0) / 2.0
+            pp = np.log(2.0 * np.pi) * (m + ranks) / 2.0
+
+            upper = np.triu(np.ones((n_features, n_features), dtype=bool), k=1)  # pairs i < j
+            differences = np.where(upper, np.log(np.subtract.outer(spectrum, spectrum)), 0.0)
+            inverse = 1.0 / spectrum
+            inverse_differences = np.where(upper, np.log(np.subtract.outer(inverse, inverse).T), 0.0)
+            # Pairs i < rank <= j use the mean of the remaining eigenvalues `v` instead of the j-th one
+            pa = np.cumsum(differences.sum(axis=1))[:-1] + np.cumsum(inverse_differences.sum(axis=0))[:-1]
+            for rank in ranks:
+                pa[rank - 1] += (n_features - rank) * np.sum(np.log(1.0 / v[rank - 1] - inverse[:rank]))
+            pa += np.cumsum(n_features - 1 - np.arange(n_features - 1)) * np.log(n_samples)
+
+            log_likelihood = pu + pl + pv + pp - pa / 2.0 - ranks * np.log(n_samples) / 2.0
+        log_likelihood[spectrum[:-1] < eps] = -np.inf
+        log_likelihood[~np.isfinite(log_likelihood)] = -np.inf
+        if np.all(log_likelihood == -np.inf):
+            return 1
+        return int(np.argmax(log_likelihood)) + 1
+
+    def _randomized_svd(self, matmat, rmatmat, shape: tuple, n_components: int) -> tuple:
+        rng = np.random.default_rng(self.random_state)
+        n_random = min(n_components + self.n_oversamples, min(shape))
+        q, _ = np.linalg.qr(matmat(rng.standard_normal((shape[1], n_random), dtype=self.dtype)))
+        for _ in range(self.n_iter):
+            z, _ = np.linalg.qr(rmatmat(q))
+            q, _ = np.linalg.qr(matmat(z))
+        u_small, s, vt = np.linalg.svd(rmatmat(q).T, full_matrices=False)
+        return (q @ u_small)[:, :n_components], s[:n_components], vt[:n_components]
+
+    def _total_variance(self, dense: np.ndarray, block: sp.csr_matrix, mean: np.ndarray) -> float:
+        n_samples = dense.shape[0]
+        total_variance = dense.var(axis=0, ddof=1, dtype=np.float64).sum()
+        if block is not None:
+            block_mean = mean[dense.shape[1]:].astype(np.float64)
+            block_sq_mean = np.asarray(block.multiply(block).mean(axis=0, dtype=np.float64)).ravel()
+            total_variance += ((block_sq_mean - block_mean ** 2) * n_samples / (n_samples - 1)).sum()
+        return total_variance
+
+    def _max_residual(self, matmat, rmatmat, vt: np.ndarray, s: np.ndarray) -> float:
+        eigenvalues = s.astype(np.float64) ** 2
+        nonzero = eigenvalues > 0
+        if not nonzero.any():
+            return 0.0
+        residual = np.linalg.norm(rmatmat(matmat(vt.T)) - vt.T * eigenvalues, axis=0)
+        return float(np.max(residual[nonzero] / eigenvalues[nonzero]))
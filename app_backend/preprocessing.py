@@ -0,0 +1,369 @@
+import numpy as np
+import pandas as pd
+
+from .transform_plan import CompiledPlan
+from .type_inference import TypeInference
+
+
+# Translate variable type name from pandas type
+def translate_variable_type(variable_type) -> str:
+    """
+    Translates the variable type from pandas type.
+    Numbers and booleans are 'numerical', text, `category` and all other types are 'categorical'.
+
+    Args:
+        variable_type (str): Type of the variable.
+
+    Returns:
+        str: Translated variable type.
+    """
+    try:
+        dtype = pd.api.types.pandas_dtype(variable_type)
+    except TypeError:
+        return 'categorical'
+    if isinstance(dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(dtype):
+        return 'categorical'
+    return 'numerical'
+
+
+# Converted copy of a variable of the opposite type
+def convert_variable_type(column: pd.Series, name: str) -> pd.Series:
+    if translate_variable_type(column.dtype) == 'categorical':
+        # Convert comma-separated decimal numbers to float
+        try:
+            return column.astype(str).str.replace(',', '.').astype(float)
+        except ValueError:
+            raise ValueError(f"Cannot convert column '{name}' to numeric. Ensure that all values, including comma-separated decimals, are convertible to float.")
+    # Convert numerical to categorical
+    return column.astype('object')
+
+
+class _RunningMoments:
+    """
+    Mean and variance of a group of variables, updated batch by batch (Chan et al.). Missing values are skipped.
+    """
+
+    def __init__(self, n_columns: int) -> None:
+        self.count = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+
+    def update(self, block: np.ndarray) -> None:
+        valid = ~np.isnan(block)
+        count = valid.sum(axis=0)
+        mean = np.where(valid, block, 0.0).sum(axis=0) / np.maximum(count, 1)
+        m2 = np.where(valid, (block - mean) ** 2, 0.0).sum(axis=0)
+
+        total = self.count + count
+        delta = mean - self.mean
+        share = np.divide(count, total, out=np.zeros_like(total), where=total > 0)
+        self.m2 += m2 + delta ** 2 * self.count * share
+        self.mean += delta * share
+        self.count = total
+
+    def location_scale(self) -> tuple:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.mean.copy(), np.sqrt(self.m2 / (self.count - 1))
+
+
+class _ReservoirSample:
+    """
+    Uniform random sample of the values of a group of variables, used to estimate quantiles in one pass.
+    Every value gets a random key, the values with the smallest keys form the sample.
+    """
+
+    def __init__(self, n_columns: int, size: int, rng: np.random.Generator) -> None:
+        self.size = size
+        self.rng = rng
+        self.keys = [np.empty(0) for _ in range(n_columns)]
+        self.values = [np.empty(0) for _ in range(n_columns)]
+
+    def update(self, block: np.ndarray) -> None:
+        for i in range(block.shape[1]):
+            values = block[:, i][~np.isnan(block[:, i])]
+            keys = np.concatenate([self.keys[i], self.rng.random(len(values))])
+            values = np.concatenate([self.values[i], values])
+            if len(keys) > self.size:
+                keep = np.argpartition(keys, self.size)[:self.size]
+                keys, values = keys[keep], values[keep]
+            self.keys[i], self.values[i] = keys, values
+
+    def location_scale(self) -> tuple:
+        location, q75 = np.array([np.quantile(values, [0.25, 0.75]) if len(values) else [np.nan, np.nan]
+                                  for values in self.values]).T
+        return location, q75 - location
+
+
+class Preprocessor:
+    """
+    Replays the operations of a `CompiledPlan` on batches of rows, so the data never has to be loaded at once.
+
+    The statistics the operations depend on are fitted first, in streaming passes over the data (`fit`):
+    means and standard deviations are accumulated exactly, quartiles are estimated from a uniform sample
+    of each variable, and the categories of one-hot encoded variables are collected. Every variable needs
+    one pass per normalization in its chain, variables are processed side by side, so the usual
+    'standardize, then one-hot encode' preparation takes a single pass.
+
+    After fitting, every batch is transformed independently (`transform`) into rows of the design matrix:
+    the remaining variables, then the indicators of the one-hot encoded variables in encoding order
+    (the ones stored in the sparse block by DataManager last), as in `DataManager.PCA`.
+    """
+
+    def __init__(self, compiled: CompiledPlan, source_names: list, quantile_sample_size: int = 100_000,
+                 random_state: int = None, pipeline: 'Pipeline' = None) -> None:
+        """
+        Args:
+            compiled (CompiledPlan): Operations to replay.
+            source_names (list): Names of the columns of the base DataFrame of the plan.
+            quantile_sample_size (int, optional): Number of values per variable used to estimate quartiles.
+            random_state (int, optional): Seed of the quartile sampling.
+            pipeline (Pipeline, optional): Operations executed before the plan was recorded, replayed with their
+                fitted parameters on every batch first. The batches then have the columns of the loaded data.
+        """
+        self.compiled = compiled
+        self.source_names = list(source_names)
+        self.pipeline = pipeline
+        self.quantile_sample_size = quantile_sample_size
+        self.rng = np.random.default_rng(random_state)
+        self.steps = compiled.steps()
+
+        self.stats = {}  # (step, source) -> (location, scale)
+        self.categories = {}  # source of a one-hot encoded variable -> categories
+        self.feature_names = None
+
+    # Number of streaming passes needed by `fit`
+    def n_passes(self) -> int:
+        passes = 0
+        for column in self.compiled.columns + self.compiled.encoded:
+            n_normalizations = sum(1 for operation in column.chain if operation[0] == 'normalize')
+            passes = max(passes, n_normalizations + (1 if column.one_hot is not None else 0))
+        return passes
+
+    # Fit the statistics
+    def fit(self, batches) -> None:
+        """
+        Fits normalization statistics and one-hot categories in streaming passes.
+
+        Args:
+            batches (callable): Returns a new iterator over the batches (DataFrames with the columns
+                of the base DataFrame of the plan) every time it is called.
+        """
+        for _ in range(self.n_passes()):
+            accumulators = {}
+            for batch in batches():
+                self._apply(batch, accumulators)
+            self._finish(accumulators)
+
+        names = [column.name for column in self.compiled.columns]
+        for column in self._encoded_in_output_order():
+            _, prefix, _ = column.one_hot
+            names += [f'{prefix}_{category}' for category in self.categories.get(column.source, [])]
+        self.feature_names = names
+
+    # Transform a batch
+    def transform(self, batch: pd.DataFrame) -> pd.DataFrame:
+        """
+        Applies the operations to a batch.
+
+        Args:
+            batch (pd.DataFrame): Rows with the columns of the base DataFrame of the plan.
+
+        Returns:
+            pd.DataFrame: Rows of the design matrix, with the index of the batch
+            (rows with missing values removed, if the plan removes them).
+        """
+        if self.feature_names is None:
+            raise ValueError("Preprocessor is not fitted.")
+        frame = self._apply(batch, None)
+
+        n_rows = len(frame)
+        remaining = [column.source for column in self.compiled.columns]
+        parts = [frame[remaining].to_numpy(dtype=np.float64, na_value=np.nan)] if remaining else []
+        for column in self._encoded_in_output_order():
+            categories = self.categories.get(column.source, [])
+            codes = pd.Categorical(frame[column.source], categories=categories).codes
+            indicators = np.zeros((n_rows, len(categories)))
+            rows = np.flatnonzero(codes >= 0)  # missing and unseen values get no indicator
+            indicators[rows, codes[rows]] = 1.0
+            parts.append(indicators)
+        design = np.hstack(parts) if parts else np.empty((n_rows, 0))
+        return pd.DataFrame(design, index=frame.index, columns=self.feature_names, copy=False)
+
+    def _apply(self, batch: pd.DataFrame, accumulators: dict) -> pd.DataFrame:
+        # Applies every operation with known statistics. While fitting (accumulators given), variables
+        # reaching an operation without statistics feed the accumulators and are not processed further.
+        if self.pipeline is not None:
+            batch = self.pipeline.transform(batch)
+        missing = [name for name in self.source_names if name not in batch.columns]
+        if missing:
+            raise KeyError(f"Variables {missing} not found in the data.")
+        frame = batch[self.source_names].copy(deep=False)
+        frame.columns = range(frame.shape[1])
+        keep = None
+        if self.compiled.nan_sources is not None:
+            keep = frame.iloc[:, self.compiled.nan_sources].notna().all(axis=1).to_numpy()
+        late = self.compiled.filters_late()
+        if keep is not None and not late:
+            frame = frame[keep]
+        frame = frame[self.compiled.kept_sources()]
+
+        for k, step in enumerate(self.steps):
+            for operation, sources in step.items():
+                sources = [source for source in sources if source in frame.columns]
+                if operation[0] == 'change_type':
+                    for source in sources:
+                        frame[source] = convert_variable_type(frame[source], str(self.source_names[source]))
+                    continue
+
+                unknown = [source for source in sources if (k, source) not in self.stats]
+                if unknown:
+                    if accumulators is None:
+                        raise ValueError("Preprocessor is not fitted.")
+                    # Variables normalized before the NaN removal take their statistics from all rows
+                    groups = [(unknown, None)]
+                    if late:
+                        before = [source for source in unknown if self.compiled.unfiltered(k, source)]
+                        groups = [(before, None), ([source for source in unknown if source not in before], keep)]
+                    for group, rows in groups:
+                        if not group:
+                            continue
+                        block = frame[group].to_numpy(dtype=np.float64, na_value=np.nan)
+                        key = (k, operation[1], tuple(group))
+                        if key not in accumulators:
+                            accumulators[key] = _RunningMoments(len(group)) if operation[1] == 'std' \
+                                else _ReservoirSample(len(group), self.quantile_sample_size, self.rng)
+                        accumulators[key].update(block if rows is None else block[rows])
+                    frame = frame.drop(columns=unknown)
+
+                known = [source for source in sources if (k, source) in self.stats]
+                if known:
+                    location = np.array([self.stats[(k, source)][0] for source in known])
+                    scale = np.array([self.stats[(k, source)][1] for source in known])
+                    block = frame[known].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+                    block -= location
+                    block /= scale
+                    frame[known] = block
+
+        if late:
+            # Encodings recorded before the NaN removal keep the categories of the removed rows
+            self._collect_categories(frame, accumulators, unfiltered=True)
+            frame = frame[keep]
+        self._collect_categories(frame, accumulators, unfiltered=False if late else None)
+        return frame
+
+    def _collect_categories(self, frame: pd.DataFrame, accumulators: dict, unfiltered: bool = None) -> None:
+        # Categories of the encoded variables in the frame, only of the ones encoded before (or after)
+        # the NaN removal if `unfiltered` is given
+        if accumulators is None:
+            return
+        for column in self.compiled.encoded:
+            if unfiltered is not None and column.unfiltered_categories != unfiltered:
+                continue
+            if column.source in frame.columns and column.source not in self.categories:
+                values = accumulators.setdefault(('categories', column.source), set())
+                values.update(frame[column.source].dropna().unique().tolist())
+
+    def _finish(self, accumulators: dict) -> None:
+        for key, accumulator in accumulators.items():
+            if key[0] == 'categories':
+                self.categories[key[1]] = sorted(accumulator)
+                continue
+            k, _, sources = key
+            location, scale = accumulator.location_scale()
+            scale[~(scale > 0)] = 1.0  # constant variables are only centered, as in DataManager
+            for source, source_location, source_scale in zip(sources, location, scale):
+                self.stats[(k, source)] = (source_location, source_scale)
+
+    def _encoded_in_output_order(self) -> list:
+        # Dense indicators are added to the DataFrame, sparse ones go to the sparse block after it
+        dense = [column for column in self.compiled.encoded if not column.one_hot[2]]
+        sparse = [column for column in self.compiled.encoded if column.one_hot[2]]
+        return dense + sparse
+
+
+class Pipeline:
+    """
+    Operations executed by DataManager since the data was loaded, recorded together with their fitted
+    parameters (normalization location and scale, one-hot categories), so the same preparation can be
+    applied to new rows (`transform`).
+
+    Steps are tuples stored in a tuple, `add` returns a new Pipeline, so a pipeline can be kept
+    in the undo history without copying. Recorded steps:
+
+    - ('delete', names), ('rename', {old name: new name}), ('remove_nan', names),
+    - ('change_type', names), ('convert', {name: suggested type}),
+    - ('normalize', names, location, scale),
+    - ('one_hot', name, prefix, categories, sparse).
+    """
+
+    def __init__(self, source_names: list, steps: tuple = ()) -> None:
+        self.source_names = list(source_names)
+        self.steps = tuple(steps)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    # Record a step
+    def add(self, *step) -> 'Pipeline':
+        return Pipeline(self.source_names, self.steps + (step,))
+
+    # Apply the recorded steps to new data
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Applies the recorded steps to new data. One-hot encoding uses the recorded categories,
+        values not seen when the step was recorded get no indicator.
+
+        Args:
+            df (pd.DataFrame): New data with the variables of the loaded data.
+
+        Returns:
+            pd.DataFrame: Rows of the design matrix (the DataFrame followed by the sparse block),
+            with the index of `df` (rows with missing values removed, if they were removed).
+        """
+        missing = [name for name in self.source_names if name not in df.columns]
+        if missing:
+            raise KeyError(f"Variables {missing} not found in the data.")
+        frame = df[self.source_names].copy(deep=False)
+        sparse = pd.DataFrame(index=frame.index)  # indicators DataManager keeps in the sparse block
+
+        for step in self.steps:
+            operation = step[0]
+            if operation == 'delete':
+                frame = frame.drop(columns=[name for name in step[1] if name in frame.columns])
+                sparse = sparse.drop(columns=[name for name in step[1] if name in sparse.columns])
+            elif operation == 'rename':
+                frame = frame.rename(columns=step[1])
+                sparse = sparse.rename(columns=step[1])
+            elif operation == 'remove_nan':
+                rows = frame[list(step[1])].notna().all(axis=1)
+                frame, sparse = frame[rows], sparse[rows]
+            elif operation == 'change_type':
+                for name in step[1]:
+                    frame[name] = convert_variable_type(frame[name], name)
+            elif operation == 'convert':
+                type_inference = TypeInference()
+                for name, variable_type in step[1].items():
+                    frame[name] = type_inference.convert(frame[name], variable_type)
+            elif operation == 'normalize':
+                _, names, location, scale = step
+                block = frame[list(names)].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+                block -= location
+                block /= scale
+                frame[list(names)] = block
+            elif operation == 'one_hot':
+                _, name, prefix, categories, to_sparse = step
+                codes = pd.Categorical(frame[name], categories=categories).codes
+                indicators = np.zeros((len(frame), len(categories)), dtype=int)
+                rows = np.flatnonzero(codes >= 0)  # missing and unseen values get no indicator
+                indicators[rows, codes[rows]] = 1
+                encoded = pd.DataFrame(indicators, index=frame.index,
+                                       columns=[f'{prefix}_{category}' for category in categories])
+                frame = frame.drop(columns=[name])
+                if to_sparse:
+                    sparse = pd.concat([sparse, encoded], axis=1)
+                else:
+                    frame = pd.concat([frame, encoded], axis=1)
+            else:
+                raise ValueError(f"Unknown operation '{operation}'.")
+
+        return pd.concat([frame, sparse], axis=1)
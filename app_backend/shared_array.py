@@ -0,0 +1,69 @@
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+class SharedArray:
+    """
+    NumPy array placed in a shared memory segment, so worker processes of a pool can read it
+    without the array being pickled for every task. The creating process owns the segment
+    and removes it with `close` (also when used as a context manager).
+
+    Workers receive `spec` (for example through the pool initializer) and call `attach_shared_array`.
+    """
+
+    def __init__(self, shape: tuple, dtype) -> None:
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        self.memory = SharedMemory(create=True, size=max(1, size))
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.memory.buf)
+        # Everything a worker needs to attach the array
+        self.spec = (self.memory.name, tuple(shape), dtype.str)
+
+    # Copy an array into shared memory
+    @classmethod
+    def from_array(cls, array: np.ndarray, chunk_size: int = 10_000) -> 'SharedArray':
+        """
+        Creates a shared copy of an array. Rows are copied in chunks, so memory-mapped arrays
+        are not loaded as a whole.
+
+        Args:
+            array (np.ndarray): Array to share.
+            chunk_size (int, optional): Rows copied at once. Defaults to 10 000.
+
+        Returns:
+            SharedArray: Shared copy.
+        """
+        shared = cls(array.shape, array.dtype)
+        for start in range(0, array.shape[0], chunk_size):
+            shared.array[start:start + chunk_size] = array[start:start + chunk_size]
+        return shared
+
+    # Release the shared memory
+    def close(self) -> None:
+        # Views of the buffer have to be released before it is closed
+        self.array = None
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self) -> 'SharedArray':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+# Attach a shared array in a worker process
+def attach_shared_array(spec: tuple) -> tuple:
+    """
+    Attaches an array created by `SharedArray` in another process.
+
+    Args:
+        spec (tuple): `SharedArray.spec` of the array.
+
+    Returns:
+        tuple: The shared memory segment (keep a reference to it while the array is used) and the array.
+    """
+    name, shape, dtype = spec
+    memory = SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf)
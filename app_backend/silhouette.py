@@ -0,0 +1,170 @@
+import numpy as np
+from scipy import sparse
+from scipy.stats import norm
+from sklearn import config_context
+from sklearn.metrics import pairwise_distances, silhouette_score
+
+
+class SilhouetteScorer:
+    """
+    Silhouette score of a clustering in one of the modes:
+
+    - 'exact': the full silhouette score, O(n^2) distances,
+    - 'sample': mean silhouette of a stratified sample of rows, each compared with all rows, O(s * n) distances,
+      reported with a confidence interval,
+    - 'simplified': distances to the cluster centroids instead of all rows of the clusters, O(n * k) distances,
+    - 'auto': 'exact' for small data, 'sample' for medium data and 'simplified' for large data.
+
+    As in scikit-learn, every label (also the DBSCAN noise label -1) is treated as a cluster and rows of
+    single-row clusters have silhouette 0.
+    """
+
+    MODES = ('auto', 'exact', 'sample', 'simplified')
+    EXACT_MAX_SAMPLES = 10_000  # largest data scored exactly in the 'auto' mode
+    SAMPLE_MAX_SAMPLES = 500_000  # largest data scored on a sample in the 'auto' mode
+
+    def __init__(self, mode: str = 'auto', sample_size: int = 2000, confidence: float = 0.95,
+                 random_state: int = None, chunk_size: int = 10_000, working_memory: int = 64) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown silhouette mode '{mode}'. Available modes: {', '.join(self.MODES)}.")
+        if sample_size < 2:
+            raise ValueError("Sample size must be at least 2.")
+        if not 0 < confidence < 1:
+            raise ValueError("Confidence level must be between 0 and 1.")
+        self.mode = mode
+        self.sample_size = sample_size
+        self.confidence = confidence
+        self.random_state = random_state
+        self.chunk_size = chunk_size  # rows compared with the centroids at once in the 'simplified' mode
+        self.working_memory = working_memory  # MiB of distances held at once in the 'exact' and 'sample' modes
+
+    # Mode used for data of the given size
+    def choose(self, n_samples: int) -> str:
+        if self.mode != 'auto':
+            return self.mode
+        if n_samples <= self.EXACT_MAX_SAMPLES:
+            return 'exact'
+        if n_samples <= self.SAMPLE_MAX_SAMPLES:
+            return 'sample'
+        return 'simplified'
+
+    # Silhouette score as a single number
+    def score(self, data, labels) -> float:
+        """
+        Computes the silhouette score of a clustering.
+
+        Args:
+            data (array-like): Clustered rows.
+            labels (array-like): Cluster label of every row.
+
+        Returns:
+            float: Silhouette score.
+        """
+        return self.evaluate(data, labels)['score']
+
+    # Silhouette score with the mode and the confidence interval
+    def evaluate(self, data, labels) -> dict:
+        """
+        Computes the silhouette score of a clustering.
+
+        Args:
+            data (array-like): Clustered rows.
+            labels (array-like): Cluster label of every row.
+
+        Returns:
+            dict: 'score', 'lower' and 'upper' (bounds of the confidence interval, equal to the score
+            unless the score is estimated on a sample) and 'mode'.
+        """
+        data = np.asarray(data)
+        _, labels = np.unique(np.asarray(labels), return_inverse=True)
+        n_samples, n_clusters = len(labels), labels.max() + 1 if len(labels) else 0
+        if not 2 <= n_clusters <= n_samples - 1:
+            raise ValueError(f"Number of labels is {n_clusters}. Valid values are 2 to n_samples - 1 (inclusive).")
+
+        mode = self.choose(n_samples)
+        if mode == 'sample' and self.sample_size >= n_samples:
+            mode = 'exact'
+        if mode == 'exact':
+            # scikit-learn computes the distances in chunks of its working memory (1 GiB by default)
+            with config_context(working_memory=self.working_memory):
+                score = float(silhouette_score(data, labels))
+            return {'score': score, 'lower': score, 'upper': score, 'mode': mode}
+        if mode == 'simplified':
+            score = float(np.mean(self._simplified(data, labels, n_clusters)))
+            return {'score': score, 'lower': score, 'upper': score, 'mode': mode}
+        return self._sampled(data, labels, n_clusters)
+
+    def _sampled(self, data: np.ndarray, labels: np.ndarray, n_clusters: int) -> dict:
+        n_samples = len(labels)
+        rng = np.random.default_rng(self.random_state)
+        cluster_sizes = np.bincount(labels, minlength=n_clusters)
+
+        # Proportional allocation, at least two rows of every cluster to estimate its variance
+        allocation = np.maximum(np.round(self.sample_size * cluster_sizes / n_samples).astype(int), 2)
+        allocation = np.minimum(allocation, cluster_sizes)
+        order = np.argsort(labels, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(cluster_sizes)[:-1]))
+        rows = np.concatenate([
+            order[start + rng.choice(size, size=count, replace=False)]
+            for start, size, count in zip(starts, cluster_sizes, allocation)
+        ])
+
+        values = self._sample_silhouettes(data, labels, n_clusters, rows)
+        sampled_labels = labels[rows]
+
+        # Stratified mean and its variance with the finite population correction
+        weights = cluster_sizes / n_samples
+        means = np.bincount(sampled_labels, weights=values, minlength=n_clusters) / allocation
+        squares = np.bincount(sampled_labels, weights=values ** 2, minlength=n_clusters)
+        variances = np.zeros(n_clusters)
+        multiple = allocation > 1
+        variances[multiple] = (squares[multiple] - allocation[multiple] * means[multiple] ** 2) / (allocation[multiple] - 1)
+        variance = np.sum(weights ** 2 * np.maximum(variances, 0) / allocation * (1 - allocation / cluster_sizes))
+
+        score = float(np.sum(weights * means))
+        margin = norm.ppf((1 + self.confidence) / 2) * np.sqrt(variance)
+        return {'score': score, 'lower': float(score - margin), 'upper': float(score + margin), 'mode': 'sample'}
+
+    # Exact silhouettes of the chosen rows, compared with all rows
+    def _sample_silhouettes(self, data: np.ndarray, labels: np.ndarray, n_clusters: int, rows: np.ndarray) -> np.ndarray:
+        n_samples = len(labels)
+        cluster_sizes = np.bincount(labels, minlength=n_clusters)
+        membership = sparse.csr_matrix((np.ones(n_samples), (np.arange(n_samples), labels)),
+                                       shape=(n_samples, n_clusters))
+        # Sampled rows compared with all rows at once, so that their distances fit in the working memory
+        step = max(1, self.working_memory * 2 ** 20 // (8 * n_samples))
+        values = np.empty(len(rows))
+        for start in range(0, len(rows), step):
+            chunk = rows[start:start + step]
+            # Sum of distances from every chosen row to the rows of every cluster
+            sums = np.asarray(membership.T.dot(pairwise_distances(data, data[chunk])).T)
+            own = labels[chunk]
+            own_size = cluster_sizes[own]
+            intra = sums[np.arange(len(chunk)), own] / np.maximum(own_size - 1, 1)
+            sums[np.arange(len(chunk)), own] = np.inf
+            inter = np.min(sums / cluster_sizes, axis=1)
+            values[start:start + step] = self._silhouette(intra, inter, own_size)
+        return values
+
+    # Silhouettes with the distances to the cluster centroids
+    def _simplified(self, data: np.ndarray, labels: np.ndarray, n_clusters: int) -> np.ndarray:
+        cluster_sizes = np.bincount(labels, minlength=n_clusters)
+        centroids = np.zeros((n_clusters, data.shape[1]))
+        np.add.at(centroids, labels, data)
+        centroids /= cluster_sizes[:, np.newaxis]
+
+        values = np.empty(len(labels))
+        for start in range(0, len(labels), self.chunk_size):
+            own = labels[start:start + self.chunk_size]
+            distances = pairwise_distances(data[start:start + self.chunk_size], centroids)
+            intra = distances[np.arange(len(own)), own].copy()
+            distances[np.arange(len(own)), own] = np.inf
+            values[start:start + self.chunk_size] = self._silhouette(intra, distances.min(axis=1), cluster_sizes[own])
+        return values
+
+    @staticmethod
+    def _silhouette(intra: np.ndarray, inter: np.ndarray, own_size: np.ndarray) -> np.ndarray:
+        denominator = np.maximum(intra, inter)
+        values = np.divide(inter - intra, denominator, out=np.zeros_like(intra), where=denominator > 0)
+        values[own_size == 1] = 0
+        return values
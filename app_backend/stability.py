@@ -0,0 +1,209 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.optimize import linear_sum_assignment
+from threadpoolctl import threadpool_limits
+
+from .pca_solver import PCASolver
+from .shared_array import SharedArray, attach_shared_array
+
+# Design matrix and reference components of a worker process, attached once by `_init_worker`
+_worker_state = {}
+
+
+# Attach the shared design matrix (runs in a worker process)
+def _init_worker(spec: tuple, block_specs: tuple, n_block: int, reference: np.ndarray) -> None:
+    _worker_state['memory'], _worker_state['design'] = attach_shared_array(spec)
+    _worker_state['block'] = None
+    if block_specs is not None:
+        # The sparse block is rebuilt around the shared CSR arrays, without copying them
+        attached = [attach_shared_array(block_spec) for block_spec in block_specs]
+        _worker_state['block_memory'] = [memory for memory, _ in attached]
+        data, indices, indptr = (array for _, array in attached)
+        _worker_state['block'] = sp.csr_matrix((data, indices, indptr),
+                                               shape=(len(_worker_state['design']), n_block), copy=False)
+    _worker_state['reference'] = reference
+
+
+# Refit PCA on resampled rows (runs in a worker process)
+def _refit(seed: np.random.SeedSequence, method: str, fraction: float, n_components: int) -> tuple:
+    design, block = _worker_state['design'], _worker_state['block']
+    n_samples = len(design)
+    rng = np.random.default_rng(seed)
+    if method == 'bootstrap':
+        rows = rng.integers(0, n_samples, size=n_samples)
+    else:
+        rows = np.sort(rng.choice(n_samples, size=max(n_components + 1, int(fraction * n_samples)), replace=False))
+
+    # One BLAS thread per process, the pool already uses all cores
+    with threadpool_limits(limits=1, user_api='blas'):
+        solver = PCASolver(dtype=design.dtype.type, n_jobs=1, random_state=int(rng.integers(2 ** 31)))
+        solver.fit(design[rows], None if block is None else block[rows], n_components)
+    return _align(solver.components, solver.explained_variance, _worker_state['reference'])
+
+
+# Match refitted components to the reference ones
+def _align(components: np.ndarray, explained_variance: np.ndarray, reference: np.ndarray) -> tuple:
+    """
+    Matches refitted components to the reference components and aligns their signs. Components with
+    similar variances can swap places between refits, so they are paired by the largest absolute cosine.
+
+    Args:
+        components (np.ndarray): Refitted components (n_components x n_features).
+        explained_variance (np.ndarray): Explained variance ratios of the refitted components.
+        reference (np.ndarray): Reference components (n_components x n_features).
+
+    Returns:
+        tuple: Explained variance ratios and components in the order and with the signs of the reference.
+    """
+    similarity = np.abs(reference @ components.T)
+    _, order = linear_sum_assignment(-similarity)
+    components = components[order]
+    signs = np.sign(np.sum(reference * components, axis=1))
+    signs[signs == 0] = 1
+    return explained_variance[order], components * signs[:, np.newaxis]
+
+
+class StabilityAnalysis:
+    """
+    Stability of PCA estimated by refitting it on resampled rows:
+
+    - 'bootstrap': rows drawn with replacement, as many as in the data,
+    - 'subsample': a fraction of the rows drawn without replacement.
+
+    Refits run in a process pool. The design matrix is placed once in shared memory and all worker processes
+    read it from there; a sparse block of one-hot indicators is shared as its CSR arrays, so it is never
+    made dense. Refitted components are matched to the components of the whole data and their signs
+    are aligned before percentile confidence intervals are computed. With a time budget, the analysis stops
+    when the budget is used and reports the intervals of the refits done so far.
+    """
+
+    METHODS = ('bootstrap', 'subsample')
+
+    def __init__(self, n_resamples: int = 200, method: str = 'bootstrap', subsample_fraction: float = 0.5,
+                 confidence: float = 0.95, time_budget: float = None, max_workers: int = None,
+                 random_state: int = None, dtype=np.float64) -> None:
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown resampling method '{method}'. Available methods: {', '.join(self.METHODS)}.")
+        if n_resamples <= 0:
+            raise ValueError("Number of resamples must be greater than zero.")
+        if not 0 < confidence < 1:
+            raise ValueError("Confidence level must be between 0 and 1.")
+        if not 0 < subsample_fraction < 1:
+            raise ValueError("Subsample fraction must be between 0 and 1.")
+        self.n_resamples = n_resamples
+        self.method = method
+        self.subsample_fraction = subsample_fraction
+        self.confidence = confidence
+        self.time_budget = time_budget  # seconds, None for no limit
+        self.max_workers = max_workers
+        self.random_state = random_state
+        self.dtype = dtype
+        self.chunk_size = 10_000  # rows copied to shared memory at once
+
+    # Run the analysis
+    def run(self, read_rows, n_samples: int, n_features: int, n_components: int, feature_names: list = None,
+            block: sp.csr_matrix = None) -> dict:
+        """
+        Refits PCA on resampled rows and computes confidence intervals.
+
+        Args:
+            read_rows (callable): Called with `(start, stop)`, returns these rows of the dense part of the design
+                matrix as a dense array (see `DataManager._row_reader`).
+            n_samples (int): Number of rows.
+            n_features (int): Number of variables, the sparse block included.
+            n_components (int): Number of principal components.
+            feature_names (list, optional): Names of the variables. Defaults to positions.
+            block (sp.csr_matrix, optional): Sparse part of the design matrix, following the dense part.
+
+        Returns:
+            dict: 'explained_variance' (DataFrame with the estimate, the standard error and the interval
+            of every component), 'loadings', 'loadings_lower' and 'loadings_upper' (DataFrames of variables
+            x components), 'n_resamples' (number of refits done) and 'time'.
+        """
+        start = time.perf_counter()
+        n_block = 0 if block is None else block.shape[1]
+        block_arrays = [] if block is None else [SharedArray.from_array(array, self.chunk_size)
+                                                 for array in (block.data, block.indices, block.indptr)]
+        try:
+            with SharedArray((n_samples, n_features - n_block), self.dtype) as shared:
+                for row in range(0, n_samples, self.chunk_size):
+                    stop = min(row + self.chunk_size, n_samples)
+                    shared.array[row:stop] = read_rows(row, stop)
+
+                shared_block = None
+                if block is not None:
+                    shared_block = sp.csr_matrix(tuple(array.array for array in block_arrays),
+                                                 shape=block.shape, copy=False)
+                reference_solver = PCASolver(dtype=np.dtype(self.dtype).type, random_state=self.random_state)
+                reference_solver.fit(shared.array, shared_block, n_components)
+                reference = reference_solver.components
+                estimate = reference_solver.explained_variance
+                reference_solver = shared_block = None
+
+                block_specs = None if block is None else tuple(array.spec for array in block_arrays)
+                explained_variances, loadings = self._resample(shared.spec, block_specs, n_block, reference,
+                                                               n_components, start)
+        finally:
+            for array in block_arrays:
+                array.close()
+        if not loadings:
+            raise ValueError("No resample was completed within the time budget.")
+
+        explained_variances = np.array(explained_variances)
+        loadings = np.array(loadings)
+        quantiles = [(1 - self.confidence) / 2, (1 + self.confidence) / 2]
+        variance_bounds = np.quantile(explained_variances, quantiles, axis=0)
+        loading_bounds = np.quantile(loadings, quantiles, axis=0)
+
+        components = [f'pc{i + 1}' for i in range(n_components)]
+        names = feature_names if feature_names is not None else list(range(n_features))
+        return {
+            'explained_variance': pd.DataFrame({
+                'estimate': estimate,
+                'std': explained_variances.std(axis=0, ddof=1) if len(explained_variances) > 1 else np.nan,
+                'lower': variance_bounds[0],
+                'upper': variance_bounds[1],
+            }, index=components),
+            'loadings': pd.DataFrame(reference.T, index=names, columns=components),
+            'loadings_lower': pd.DataFrame(loading_bounds[0].T, index=names, columns=components),
+            'loadings_upper': pd.DataFrame(loading_bounds[1].T, index=names, columns=components),
+            'n_resamples': len(loadings),
+            'time': time.perf_counter() - start,
+        }
+
+    def _resample(self, spec: tuple, block_specs: tuple, n_block: int, reference: np.ndarray, n_components: int,
+                  start: float) -> tuple:
+        seeds = np.random.SeedSequence(self.random_state)
+        n_workers = self.max_workers or os.cpu_count() or 1
+        explained_variances, loadings = [], []
+        executor = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                       initargs=(spec, block_specs, n_block, reference))
+
+        def remaining():
+            return None if self.time_budget is None else self.time_budget - (time.perf_counter() - start)
+
+        try:
+            # Only a few refits are queued at a time, so the budget is checked between them
+            pending, submitted = set(), 0
+            while True:
+                while submitted < self.n_resamples and len(pending) < 2 * n_workers \
+                        and (remaining() is None or remaining() > 0):
+                    pending.add(executor.submit(_refit, seeds.spawn(1)[0], self.method, self.subsample_fraction,
+                                                n_components))
+                    submitted += 1
+                if not pending or (remaining() is not None and remaining() <= 0):
+                    break
+                done, pending = wait(pending, timeout=remaining(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    explained_variance, components = future.result()
+                    explained_variances.append(explained_variance)
+                    loadings.append(components)
+        finally:
+            # Queued refits are dropped, the running ones are waited for
+            executor.shutdown(wait=True, cancel_futures=True)
+        return explained_variances, loadings
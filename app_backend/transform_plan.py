@@ -0,0 +1,191 @@
+class _Column:
+    """
+    Column of the base DataFrame followed through the recorded operations.
+    """
+
+    def __init__(self, source: int, name: str, variable_type: str) -> None:
+        self.source = source  # position in the base DataFrame
+        self.name = name
+        self.type = variable_type
+        self.chain = []  # per-column operations, in recorded order
+        self.one_hot = None  # (order, prefix, sparse) once the column is encoded
+        # Operations recorded before the NaN removal see all rows, as in eager execution
+        self.unfiltered_chain = 0  # number of leading chain operations recorded before the NaN removal
+        self.unfiltered_categories = False  # one-hot encoding recorded before the NaN removal
+
+
+class CompiledPlan:
+    """
+    Recorded operations rearranged into a single pass over the base DataFrame:
+
+    1. rows with missing values are found once, on the columns the NaN removal applied to,
+    2. deleted columns are skipped and the rows are filtered in one selection,
+    3. the remaining per-column operations (type changes, normalizations) are applied step by step,
+       every step to all columns sharing it at once,
+    4. all one-hot encodings are applied together,
+    5. the final names are set in one go.
+
+    Normalizations and one-hot encodings recorded before the NaN removal take their statistics and
+    categories from all rows, so the rows are then filtered after step 3 instead (`filters_late`).
+    """
+
+    def __init__(self, columns: list, encoded: list, nan_sources: list) -> None:
+        self.columns = columns  # surviving, not encoded columns, in DataFrame order
+        self.encoded = encoded  # one-hot encoded columns, in encoding order
+        self.nan_sources = nan_sources  # None if NaN rows are not removed
+
+    def kept_sources(self) -> list:
+        return sorted([column.source for column in self.columns + self.encoded])
+
+    # Whether some statistics have to be computed on the rows removed by the NaN removal
+    def filters_late(self) -> bool:
+        if self.nan_sources is None:
+            return False
+        return any(column.unfiltered_categories
+                   or any(operation[0] == 'normalize' for operation in column.chain[:column.unfiltered_chain])
+                   for column in self.columns + self.encoded)
+
+    # Whether the k-th operation in the chain of a column was recorded before the NaN removal
+    def unfiltered(self, k: int, source: int) -> bool:
+        return any(column.source == source and k < column.unfiltered_chain for column in self.columns + self.encoded)
+
+    def steps(self) -> list:
+        """
+        Groups per-column operations into steps.
+
+        Returns:
+            list: For every step, a dictionary mapping an operation to the source positions it applies to.
+        """
+        chained = self.columns + self.encoded
+        n_steps = max([len(column.chain) for column in chained], default=0)
+        steps = []
+        for k in range(n_steps):
+            step = {}
+            for column in chained:
+                if k < len(column.chain):
+                    step.setdefault(column.chain[k], []).append(column.source)
+            steps.append(step)
+        return steps
+
+
+class TransformPlan:
+    """
+    Operations recorded by DataManager in lazy mode.
+
+    The plan keeps a simulated schema (names and types of the columns), so operations are validated
+    when they are recorded, and compiles the operations into a `CompiledPlan` executed in a single pass.
+    """
+
+    def __init__(self, names: list, types: list) -> None:
+        self.ops = []
+        self.columns = [_Column(i, name, variable_type) for i, (name, variable_type) in enumerate(zip(names, types))]
+        self.dropped = []
+        self.encoded = []
+        self.nan_sources = None
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def copy(self) -> 'TransformPlan':
+        """
+        Returns an independent copy of the plan (used by the undo history).
+        """
+        plan = TransformPlan([], [])
+        plan.columns, plan.dropped, plan.encoded = self._copy_columns()
+        plan.ops = list(self.ops)
+        plan.nan_sources = None if self.nan_sources is None else set(self.nan_sources)
+        return plan
+
+    def has_column(self, name: str) -> bool:
+        return any(column.name == name for column in self.columns)
+
+    def variable_type(self, name: str) -> str:
+        return self._find(name).type
+
+    def variable_types(self) -> dict:
+        return {column.name: column.type for column in self.columns}
+
+    def names(self) -> list:
+        return [column.name for column in self.columns]
+
+    def numerical_columns(self) -> list:
+        return [column.name for column in self.columns if column.type == 'numerical']
+
+    def has_dense_one_hot(self) -> bool:
+        return any(not column.one_hot[2] for column in self.encoded)
+
+    # Recording
+
+    def delete(self, name: str) -> None:
+        column = self._find(name)
+        self.columns.remove(column)
+        self.dropped.append(column)
+        self.ops.append(('delete', name))
+
+    def rename(self, old_name: str, new_name: str) -> None:
+        self._find(old_name).name = new_name
+        self.ops.append(('rename', old_name, new_name))
+
+    def change_type(self, name: str) -> None:
+        column = self._find(name)
+        column.chain.append(('change_type',))
+        column.type = 'numerical' if column.type == 'categorical' else 'categorical'
+        self.ops.append(('change_type', name))
+
+    def normalize(self, names: list, method: str) -> None:
+        columns = [self._find(name) for name in names]
+        # Eager normalization of a text column fails, so it is rejected when recorded, not when executed
+        categorical = [column.name for column in columns if column.type == 'categorical']
+        if categorical:
+            raise ValueError(f"Cannot normalize categorical variables: {', '.join(map(str, categorical))}.")
+        for column in columns:
+            column.chain.append(('normalize', method))
+        self.ops.append(('normalize', tuple(names), method))
+
+    def one_hot(self, name: str, sparse: bool) -> None:
+        column = self._find(name)
+        column.one_hot = (len(self.encoded), column.name, sparse)
+        self.columns.remove(column)
+        self.encoded.append(column)
+        self.ops.append(('one_hot', name, sparse))
+
+    def remove_nan(self) -> None:
+        if self.nan_sources is None:
+            self.nan_sources = set()
+            # Columns only disappear and the per-column operations keep missing values, so only the first
+            # NaN removal removes rows; what was recorded before it is computed on all rows
+            for column in self.columns + self.encoded:
+                column.unfiltered_chain = len(column.chain)
+            for column in self.encoded:
+                column.unfiltered_categories = True
+        self.nan_sources.update(column.source for column in self.columns)
+        self.ops.append(('remove_nan',))
+
+    # Compilation
+
+    def compile(self) -> CompiledPlan:
+        columns, _, encoded = self._copy_columns()
+        nan_sources = None if self.nan_sources is None else sorted(self.nan_sources)
+        return CompiledPlan(columns, encoded, nan_sources)
+
+    # Helpers
+
+    def _find(self, name: str) -> _Column:
+        for column in self.columns:
+            if column.name == name:
+                return column
+        raise KeyError(f"Variable '{name}' not found in DataFrame.")
+
+    def _copy_columns(self) -> tuple:
+        copies = []
+        for group in (self.columns, self.dropped, self.encoded):
+            group_copy = []
+            for column in group:
+                column_copy = _Column(column.source, column.name, column.type)
+                column_copy.chain = list(column.chain)
+                column_copy.one_hot = column.one_hot
+                column_copy.unfiltered_chain = column.unfiltered_chain
+                column_copy.unfiltered_categories = column.unfiltered_categories
+                group_copy.append(column_copy)
+            copies.append(group_copy)
+        return tuple(copies)
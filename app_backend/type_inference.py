@@ -0,0 +1,88 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+class TypeInference:
+    """
+    Suggests variable types from a sample of values. Every check is a vectorized operation on the sample:
+
+    - 'numerical': text variables whose values are numbers, also with a decimal comma (ex. 12,37),
+    - 'categorical': integer variables with only a few distinct values (integer-coded categories),
+    - 'date': text variables whose values are dates.
+    """
+
+    NUMBER_PATTERN = r'[+-]?(\d+([.,]\d*)?|[.,]\d+)([eE][+-]?\d+)?'
+
+    def __init__(self, sample_size: int = 1000, min_match: float = 0.95, max_categories: int = 10,
+                 random_state: int = 0) -> None:
+        self.sample_size = sample_size
+        self.min_match = min_match  # fraction of sampled values that has to match a type
+        self.max_categories = max_categories
+        self.random_state = random_state
+
+    # Suggest the type of a variable
+    def suggest(self, column: pd.Series, current_type: str) -> str:
+        """
+        Suggests the type of a variable.
+
+        Args:
+            column (pd.Series): Values of the variable.
+            current_type (str): Current type of the variable ('numerical' or 'categorical').
+
+        Returns:
+            str: Suggested type ('numerical', 'categorical' or 'date'), or None if the current type fits.
+        """
+        sample = column.dropna()
+        if len(sample) == 0:
+            return None
+        if len(sample) > self.sample_size:
+            sample = sample.sample(self.sample_size, random_state=self.random_state)
+
+        if current_type == 'numerical':
+            if pd.api.types.is_integer_dtype(sample.dtype) \
+                    and 2 < column.nunique() <= self.max_categories and len(column) > 2 * self.max_categories:
+                return 'categorical'
+            return None
+
+        # Only text is checked, numbers stored as categories were made categorical on purpose
+        values = sample.cat.categories if isinstance(sample.dtype, pd.CategoricalDtype) else sample
+        if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+            return None
+        text = sample.astype(str).str.strip()
+        if text.str.fullmatch(self.NUMBER_PATTERN).mean() >= self.min_match:
+            return 'numerical'
+        if self._parse_dates(text).notna().mean() >= self.min_match:
+            return 'date'
+        return None
+
+    # Convert a variable to the suggested type
+    def convert(self, column: pd.Series, suggested_type: str) -> pd.Series:
+        """
+        Converts a variable to the suggested type. Dates are converted to numbers of days since 1970-01-01,
+        so they can be used in the analysis as numerical variables.
+
+        Args:
+            column (pd.Series): Values of the variable.
+            suggested_type (str): Type returned by `suggest`.
+
+        Returns:
+            pd.Series: Converted values.
+        """
+        if suggested_type == 'categorical':
+            return column.astype('category')
+        if suggested_type == 'numerical':
+            text = column.astype(str).str.strip().str.replace(',', '.', regex=False)
+            values = pd.to_numeric(text.where(column.notna()), errors='coerce')
+            return values.astype(np.float64)
+        if suggested_type == 'date':
+            dates = self._parse_dates(column.astype(str).str.strip().where(column.notna()))
+            return (dates - pd.Timestamp('1970-01-01')) / pd.Timedelta(days=1)
+        raise ValueError(f"Unknown variable type '{suggested_type}'.")
+
+    def _parse_dates(self, text: pd.Series) -> pd.Series:
+        # Day-first formats are the common ones in the datasets this app is used with (ex. 01.01.2020 00:00)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            return pd.to_datetime(text, errors='coerce', dayfirst=True, format='mixed')
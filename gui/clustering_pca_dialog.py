@@ -72,35 +72,105 @@ class PCADialog(QDialog):
         self.components_label = QLabel("Liczba komponentów:")
         self.components_input = QLineEdit()
         self.components_input.setText(self.default_n_components)
+        self.components_input.setToolTip("Liczba komponentów (np. 3), docelowa wyjaśniona wariancja "
+                                         "(np. 95% lub 0.95) albo 'mle' (estymator Minki)")
 
         form_layout.addWidget(self.components_label)
         form_layout.addWidget(self.components_input)
 
+        # Wybór algorytmu SVD, 'auto' dobiera go do rozmiaru danych
+        self.solver_label = QLabel("Algorytm SVD:")
+        self.solver_combo = QComboBox()
+        self.solver_combo.addItems(['auto', 'full', 'randomized', 'arpack', 'covariance'])
+        form_layout.addWidget(self.solver_label)
+        form_layout.addWidget(self.solver_combo)
+
+        # Precyzja obliczeń, 'float32' zmniejsza o połowę zużycie pamięci
+        self.precision_label = QLabel("Precyzja:")
+        self.precision_combo = QComboBox()
+        self.precision_combo.addItems(['float64', 'float32'])
+        self.precision_combo.setCurrentText(self.data_instance.precision)
+        form_layout.addWidget(self.precision_label)
+        form_layout.addWidget(self.precision_combo)
+
         layout.addLayout(form_layout)
 
+        # Kernel PCA (przybliżenie Nystroma), liczba punktów odniesienia decyduje o dokładności
+        kernel_layout = QHBoxLayout()
+        self.kernel_label = QLabel("Jądro:")
+        self.kernel_combo = QComboBox()
+        self.kernel_combo.addItems(['liniowe', 'rbf', 'poly'])
+        self.landmarks_label = QLabel("Punkty odniesienia:")
+        self.landmarks_spinbox = QSpinBox()
+        self.landmarks_spinbox.setRange(10, 100000)
+        self.landmarks_spinbox.setValue(500)
+        kernel_layout.addWidget(self.kernel_label)
+        kernel_layout.addWidget(self.kernel_combo)
+        kernel_layout.addWidget(self.landmarks_label)
+        kernel_layout.addWidget(self.landmarks_spinbox)
+        layout.addLayout(kernel_layout)
+
         self.pca_button = QPushButton("Uruchom PCA -> wybierz folder do zapisu wykresu i danych")
         self.pca_button.clicked.connect(self.run_pca)
 
         layout.addWidget(self.pca_button)
         self.setLayout(layout)
 
+    # Liczba komponentów, docelowa wyjaśniona wariancja (ułamek) albo 'mle'
+    def parse_n_components(self, text):
+        text = text.strip().lower().replace(',', '.')
+        if text == 'mle':
+            return 'mle'
+        if text.isdigit():
+            n_components = int(text)
+            # W kernel PCA liczbę komponentów ogranicza liczba punktów odniesienia, a nie zmiennych
+            if self.kernel_combo.currentText() == 'liniowe':
+                max_components = len(self.data_instance.get_variable_names())
+            else:
+                max_components = self.landmarks_spinbox.value()
+            return n_components if 0 < n_components <= max_components else None
+        try:
+            fraction = float(text[:-1]) / 100 if text.endswith('%') else float(text)
+        except ValueError:
+            return None
+        return fraction if 0 < fraction < 1 else None
+
     def run_pca(self):
-        n_components = self.components_input.text()
+        n_components = self.parse_n_components(self.components_input.text())
 
-        if not n_components.isdigit() or not 0 < int(n_components) <= len(self.data_instance.get_df().columns):
-            QMessageBox.warning(self, "Błąd", "Podano niepoprawną liczbę komponentów do analizy PCA.")
+        if n_components is None:
+            QMessageBox.warning(self, "Błąd", "Podano niepoprawną liczbę komponentów do analizy PCA. "
+                                              "Podaj liczbę komponentów, wariancję (np. 95%) albo 'mle'.")
             return
 
         # Otwieranie dialogu wyboru folderu bezpośrednio przed uruchomieniem PCA
         directory = QFileDialog.getExistingDirectory(self, "Wybierz folder do zapisu wyników i wykresu PCA")
         if directory:  # Jeśli użytkownik wybierze folder
             try:
-                n_components = int(n_components)
-                self.parent().pca_handler = self.data_instance.PCA(n_components)
+                self.data_instance.set_precision(self.precision_combo.currentText())
+                if self.kernel_combo.currentText() == 'liniowe':
+                    self.parent().pca_handler = self.data_instance.PCA(n_components,
+                                                                       svd_solver=self.solver_combo.currentText())
+                else:
+                    self.parent().pca_handler = self.data_instance.kernel_PCA(
+                        n_components, kernel=self.kernel_combo.currentText(),
+                        n_landmarks=self.landmarks_spinbox.value(), svd_solver=self.solver_combo.currentText())
                 # Przekazanie ścieżki do metody zapisującej wyniki i wykres PCA
                 self.parent().save_and_display_pca(directory, self.parent().pca_handler.get_df())
                 self.parent().pca_done = True
-                QMessageBox.information(self, "Analiza PCA", "Analiza PCA została zakończona i wyniki zostały zapisane.")
+                fit_info = self.parent().pca_handler.fit_info
+                summary = (f"Algorytm SVD: {fit_info['svd_solver']} ({self.data_instance.precision})\n"
+                           f"Liczba komponentów: {self.parent().pca_handler.get_df().shape[1]}\n"
+                           f"Czas obliczeń: {fit_info['time']:.2f} s\n"
+                           f"Błąd rekonstrukcji (względny): {fit_info['reconstruction_error']:.4f}")
+                if 'kernel' in fit_info:
+                    summary += f"\nJądro: {fit_info['kernel']}, punkty odniesienia: {fit_info['n_landmarks']}"
+                if fit_info.get('cached'):
+                    summary += "\nWykorzystano zapamiętany rozkład macierzy kowariancji"
+                if fit_info['max_residual'] is not None:
+                    summary += f"\nBłąd przybliżenia wektorów własnych: {fit_info['max_residual']:.2e}"
+                QMessageBox.information(self, "Analiza PCA",
+                                        f"Analiza PCA została zakończona i wyniki zostały zapisane.\n\n{summary}")
                 self.close()
             except ValueError as e:
                 QMessageBox.warning(self, "Wystąpił błąd", "Spróbuj ponownie. Błąd: " + str(e))
@@ -1,5 +1,5 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QComboBox, QLabel, QPushButton, QHBoxLayout, QLineEdit, QTableWidget,
-                             QTableWidgetItem, QMessageBox)
+                             QTableWidgetItem, QMessageBox, QFormLayout)
 from PyQt5.QtCore import Qt
 
 
@@ -97,3 +97,83 @@ class DeleteDialog(QDialog):
         else:
             QMessageBox.warning(self, "Uwaga", "Proszę wybrać nazwę zmiennej do usunięcia.")
 
+
+class ImportRangeDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.usecols = None
+        self.rows = None
+        self.sample_fraction = None
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle('Zakres importu')
+        self.setGeometry(100, 100, 450, 200)
+
+        layout = QVBoxLayout()
+        form_layout = QFormLayout()
+
+        # Puste pola oznaczają import wszystkich zmiennych i przypadków
+        self.columns_input = QLineEdit()
+        self.columns_input.setPlaceholderText("np. 1-20, Wiek, 25 (puste = wszystkie)")
+        self.rows_from_input = QLineEdit()
+        self.rows_from_input.setPlaceholderText("pierwszy przypadek, np. 1")
+        self.rows_to_input = QLineEdit()
+        self.rows_to_input.setPlaceholderText("ostatni przypadek (puste = do końca)")
+        self.sample_input = QLineEdit()
+        self.sample_input.setPlaceholderText("losowa próbka w %, np. 10 (puste = wszystkie)")
+
+        form_layout.addRow("Zmienne (numery od 1 lub nazwy):", self.columns_input)
+        form_layout.addRow("Przypadki od:", self.rows_from_input)
+        form_layout.addRow("Przypadki do:", self.rows_to_input)
+        form_layout.addRow("Próbka [%]:", self.sample_input)
+
+        self.ok_button = QPushButton("Importuj")
+        self.ok_button.clicked.connect(self.accept_range)
+
+        layout.addLayout(form_layout)
+        layout.addWidget(self.ok_button)
+        self.setLayout(layout)
+
+    def accept_range(self):
+        try:
+            self.usecols = self.parse_columns(self.columns_input.text())
+
+            rows_from = self.rows_from_input.text().strip()
+            rows_to = self.rows_to_input.text().strip()
+            if rows_from or rows_to:
+                # Numeracja przypadków w oknie od 1, w DataManager od 0
+                start = int(rows_from) - 1 if rows_from else 0
+                stop = int(rows_to) if rows_to else None
+                if start < 0 or (stop is not None and stop <= start):
+                    raise ValueError
+                self.rows = (start, stop)
+
+            sample = self.sample_input.text().strip().rstrip('%')
+            if sample:
+                self.sample_fraction = float(sample.replace(',', '.')) / 100
+                if not 0 < self.sample_fraction <= 1:
+                    raise ValueError
+        except ValueError:
+            QMessageBox.warning(self, "Błąd", "Niepoprawny zakres importu.")
+            return
+        self.accept()
+
+    @staticmethod
+    def parse_columns(text):
+        text = text.strip()
+        if not text:
+            return None
+        columns = []
+        for item in text.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            if '-' in item and all(part.strip().isdigit() for part in item.split('-', 1)):
+                first, last = (int(part) for part in item.split('-', 1))
+                columns.extend(range(first - 1, last))
+            elif item.isdigit():
+                columns.append(int(item) - 1)
+            else:
+                columns.append(item)
+        return columns or None
@@ -2,7 +2,7 @@ import sys
 import os
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QFileDialog, QLabel, QTableWidgetItem, \
     QTableWidget, QStackedWidget, QDialog, QHBoxLayout, QLineEdit, QMessageBox, QInputDialog, QFormLayout, QSpacerItem, \
-    QSizePolicy, QBoxLayout
+    QSizePolicy, QBoxLayout, QProgressDialog
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QPixmap, QFont, QDropEvent, QDragEnterEvent
 from PyQt5.QtWidgets import QComboBox
@@ -12,6 +12,11 @@ from app_backend.data_manager import DataManager
 from gui.variable_dialog import *
 from gui.clustering_pca_dialog import *
 
+# Pliki większe niż ten próg są wczytywane strumieniowo, w kawałkach
+STREAMING_THRESHOLD_BYTES = 100 * 1024 * 1024
+STREAMING_CHUNKSIZE = 100_000
+# Zmienne kategoryczne o większej liczbie kategorii są kodowane one-hot jako macierz rzadka
+SPARSE_ONE_HOT_MIN_CATEGORIES = 50
 
 class MainWindow(QWidget):
     def __init__(self):
@@ -87,13 +92,51 @@ class MainWindow(QWidget):
             separator, ok = QInputDialog.getItem(self, "Wybierz separator", "Separator użyty w pliku CSV:", [",", ";"],
                                                  0, False)
             if ok and separator:
+                compact = QMessageBox.question(self, "Tryb kompaktowy",
+                                               "Czy wczytać dane w trybie kompaktowym (mniejsze typy liczbowe, "
+                                               "kategorie zamiast tekstu)?",
+                                               QMessageBox.Yes | QMessageBox.No, QMessageBox.No) == QMessageBox.Yes
+                range_dialog = ImportRangeDialog(self)
+                if range_dialog.exec_() != QDialog.Accepted:
+                    QMessageBox.information(self, "Anulowano", "Operacja otwarcia pliku została anulowana.", QMessageBox.Ok)
+                    return
+                selection = dict(usecols=range_dialog.usecols, rows=range_dialog.rows,
+                                 sample_fraction=range_dialog.sample_fraction)
                 try:
-                    self.process_file(file_name, separator)
+                    self.process_file(file_name, separator, compact=compact, selection=selection)
                 except Exception as e:
                     QMessageBox.warning(self, "Błąd", f"Wystąpił błąd podczas przetwarzania pliku: {e}", QMessageBox.Ok)
             else:
                 QMessageBox.information(self, "Anulowano", "Operacja otwarcia pliku została anulowana.", QMessageBox.Ok)
 
+    def open_directory_dialog(self):
+        directory = QFileDialog.getExistingDirectory(self, "Wybierz folder z plikami csv o tej samej strukturze")
+        if not directory:
+            return
+        separator, ok = QInputDialog.getItem(self, "Wybierz separator", "Separator użyty w plikach CSV:", [",", ";"],
+                                             0, False)
+        if not (ok and separator):
+            QMessageBox.information(self, "Anulowano", "Operacja otwarcia folderu została anulowana.", QMessageBox.Ok)
+            return
+
+        progress = QProgressDialog("Wczytywanie plików...", None, 0, 100, self)
+        progress.setWindowTitle("Import danych")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.show()
+
+        def update_progress(fraction):
+            progress.setValue(int(fraction * 100))
+            QApplication.processEvents()
+
+        try:
+            self.data_instance.read_from_directory(directory, sep=separator, progress_callback=update_progress)
+            self.stacked_widget.setCurrentIndex(2)
+            self.display_data_in_table(self.data_instance.get_df())
+        except Exception as e:
+            QMessageBox.warning(self, "Błąd", f"Wystąpił błąd podczas wczytywania plików: {e}", QMessageBox.Ok)
+        finally:
+            progress.close()
+
     def init_import_page(self):
         import_page = QWidget()
         layout = QVBoxLayout()
@@ -107,6 +150,11 @@ class MainWindow(QWidget):
         btn.setStyleSheet("QPushButton { width: 100px; height: 100px; }")
         layout.addWidget(btn)
 
+        dir_btn = QPushButton('Wybierz folder z plikami csv')
+        dir_btn.clicked.connect(self.open_directory_dialog)
+        dir_btn.setStyleSheet("QPushButton { width: 100px; height: 100px; }")
+        layout.addWidget(dir_btn)
+
         import_page.setLayout(layout)
         self.stacked_widget.addWidget(import_page)
 
@@ -153,18 +201,36 @@ class MainWindow(QWidget):
         undo_button.setStyleSheet("QPushButton { width: 100px; height: 100px; }")  # Ustawia wymiary kwadratowe
         buttons_layout.addWidget(undo_button)
 
+        # Stworzenie i stylizacja guzika redo
+        redo_button = QPushButton('Ponów zmianę')
+        redo_button.clicked.connect(self.redo_changes)
+        redo_button.setStyleSheet("QPushButton { width: 100px; height: 100px; }")  # Ustawia wymiary kwadratowe
+        buttons_layout.addWidget(redo_button)
+
         # Stworzenie i stylizacja guzika do zmiany typu
         change_type_button = QPushButton('Zmień typ')
         change_type_button.clicked.connect(self.open_change_type_dialog)
         change_type_button.setStyleSheet("QPushButton { width: 100px; height: 100px; }")  # Ustawia wymiary kwadratowe
         buttons_layout.addWidget(change_type_button)
 
+        # Stworzenie i stylizacja guzika do zmiany typów na sugerowane
+        suggested_types_button = QPushButton('Sugerowane typy')
+        suggested_types_button.clicked.connect(self.apply_suggested_types)
+        suggested_types_button.setStyleSheet("QPushButton { width: 100px; height: 100px; }")  # Ustawia wymiary kwadratowe
+        buttons_layout.addWidget(suggested_types_button)
+
         # Stworzenie i stylizacja guzika do usuwania nazwy zmiennej
         delete_button = QPushButton('Usuń zmienną')
         delete_button.clicked.connect(self.open_delete_dialog)
         delete_button.setStyleSheet("QPushButton { width: 100px; height: 100px; }")  # Ustawia wymiary kwadratowe
         buttons_layout.addWidget(delete_button)
 
+        # Stworzenie i stylizacja guzika raportu pamięci
+        memory_button = QPushButton('Raport pamięci')
+        memory_button.clicked.connect(self.show_memory_report)
+        memory_button.setStyleSheet("QPushButton { width: 100px; height: 100px; }")  # Ustawia wymiary kwadratowe
+        buttons_layout.addWidget(memory_button)
+
         # # guzik do przygotowania do analizy pca -> one-hot-encode plus standaryzacja calego zbioru danych
         # prepare_button = QPushButton('Analiza PCA')
         # prepare_button.clicked.connect(self.open_prepare_dialog)
@@ -226,13 +292,17 @@ class MainWindow(QWidget):
     def go_to_import_page(self):
         self.stacked_widget.setCurrentIndex(1)
 
-    def process_file(self, file_path, separator):
+    def process_file(self, file_path, separator, compact=False, selection=None):
         if not file_path.lower().endswith('.csv'):
             self.label.setText('Zaimportowano nieobsługiwany format pliku. Proszę wybrać plik CSV.')
             return
 
         try:
-            self.data_instance.read_from_csv(file_path, sep=separator)
+            if os.path.getsize(file_path) > STREAMING_THRESHOLD_BYTES:
+                self.read_large_file(file_path, separator, compact, selection)
+            else:
+                self.data_instance.read_from_csv(file_path, sep=separator, use_cache=True, compact=compact,
+                                                 **(selection or {}))
 
             # Sprawdzanie, czy DataFrame ma więcej niż jedną kolumnę jako wskazówkę, że separator może być niewłaściwy
             if self.data_instance.df.shape[1] < 2:
@@ -249,6 +319,24 @@ class MainWindow(QWidget):
                                 f"Wystąpił błąd podczas przetwarzania pliku. Proszę sprawdzić format pliku oraz wybrany separator i spróbować ponownie.",
                                 QMessageBox.Ok)
 
+    def read_large_file(self, file_path, separator, compact=False, selection=None):
+        # Wczytywanie strumieniowe z paskiem postępu
+        progress = QProgressDialog("Wczytywanie pliku...", None, 0, 100, self)
+        progress.setWindowTitle("Import danych")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.show()
+
+        def update_progress(fraction):
+            progress.setValue(int(fraction * 100))
+            QApplication.processEvents()
+
+        try:
+            self.data_instance.read_from_csv(file_path, sep=separator, chunksize=STREAMING_CHUNKSIZE,
+                                             progress_callback=update_progress, use_cache=True, compact=compact,
+                                             **(selection or {}))
+        finally:
+            progress.close()
+
     def display_data_in_table(self, df):
         if df is None:
             df = self.data_instance.get_df()
@@ -256,16 +344,16 @@ class MainWindow(QWidget):
         self.table_widget.setColumnCount(df.shape[1])
         self.table_widget.setHorizontalHeaderLabels(df.columns)
 
-        for i, row in df.iterrows():
+        # Typy zmiennych pobierane raz dla całej tabeli, a nie dla każdej komórki
+        column_data_types = [self.data_instance.get_variable_type(column_name) for column_name in df.columns]
+
+        for i, row in enumerate(df.itertuples(index=False)):
             for j, value in enumerate(row):
                 item = QTableWidgetItem(str(value))
                 # Zmiana flagi elementu, aby nie był edytowalny
                 item.setFlags(item.flags() & ~Qt.ItemIsEditable)
                 # Ustawienie tekstu wskazówki (tooltip) z typem danych dla danej kolumny
-                column_name = df.columns[j]
-                column_data_type = self.data_instance.get_variable_type(
-                    column_name)
-                item.setToolTip(f"Typ: {column_data_type}")
+                item.setToolTip(f"Typ: {column_data_types[j]}")
                 self.table_widget.setItem(i, j, item)
 
         self.table_widget.resizeColumnsToContents()
@@ -294,6 +382,71 @@ class MainWindow(QWidget):
         except Exception as e:
             QMessageBox.critical(self, "Błąd", f"Nie udało się cofnąć zmian.")
 
+    def redo_changes(self):
+        if not self.data_instance.history.can_redo():
+            QMessageBox.information(self, "Ponów zmianę", "Brak cofniętych zmian do ponowienia.")
+            return
+        try:
+            self.data_instance.redo()
+            self.display_data_in_table(self.data_instance.get_df())
+            QMessageBox.information(self, "Ponowiono zmiany", "Cofnięta zmiana została przywrócona.")
+        except Exception as e:
+            QMessageBox.critical(self, "Błąd", f"Nie udało się ponowić zmian.")
+
+    def apply_suggested_types(self):
+        try:
+            suggestions = self.data_instance.suggest_variable_types()
+        except Exception as e:
+            QMessageBox.critical(self, "Błąd", f"Nie udało się ustalić sugerowanych typów zmiennych.")
+            return
+        if not suggestions:
+            QMessageBox.information(self, "Sugerowane typy", "Typy wszystkich zmiennych są już właściwe.")
+            return
+
+        type_names = {'numerical': 'liczbowa', 'categorical': 'kategoryczna', 'date': 'data (liczba dni)'}
+        summary = "\n".join(f"{name}: {type_names.get(variable_type, variable_type)}"
+                            for name, variable_type in suggestions.items())
+        answer = QMessageBox.question(self, "Sugerowane typy",
+                                      f"Czy zmienić typy zmiennych na sugerowane?\n\n{summary}",
+                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if answer != QMessageBox.Yes:
+            return
+        try:
+            self.data_instance.save()
+            self.data_instance.apply_suggested_types(suggestions)
+            self.display_data_in_table(self.data_instance.get_df())
+        except Exception as e:
+            QMessageBox.critical(self, "Błąd", f"Nie udało się zmienić typów zmiennych: {e}")
+
+    def show_memory_report(self):
+        try:
+            report = self.data_instance.memory_report()
+        except Exception as e:
+            QMessageBox.critical(self, "Błąd", f"Nie udało się przygotować raportu pamięci.")
+            return
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Raport pamięci")
+        dialog.setGeometry(100, 100, 500, 600)
+        layout = QVBoxLayout(dialog)
+
+        total_label = QLabel(f"Łącznie: {report['memory_bytes'].sum() / 1024 ** 2:.2f} MB")
+        layout.addWidget(total_label)
+
+        table = QTableWidget(dialog)
+        table.setRowCount(len(report))
+        table.setColumnCount(2)
+        table.setHorizontalHeaderLabels(["Typ", "Pamięć [B]"])
+        table.setVerticalHeaderLabels([str(name) for name in report.index])
+        for i, (dtype, memory_bytes) in enumerate(zip(report['dtype'], report['memory_bytes'])):
+            table.setItem(i, 0, QTableWidgetItem(str(dtype)))
+            table.setItem(i, 1, QTableWidgetItem(str(int(memory_bytes))))
+        table.resizeColumnsToContents()
+        layout.addWidget(table)
+
+        dialog.setLayout(layout)
+        dialog.exec_()
+
     def open_prepare_dialog(self):
         if self.pca_done:
             QMessageBox.warning(self, "Operacja niemożliwa",
@@ -345,7 +498,10 @@ class MainWindow(QWidget):
 
             for variable_name in self.data_instance.get_df().columns.tolist():
                 if self.data_instance.get_variable_type(variable_name) == 'categorical':
-                    self.data_instance.one_hot_encode(variable_name)
+                    # Zmienne o wielu kategoriach są kodowane rzadko (macierz CSR), bez rozrastania tabeli
+                    n_categories = self.data_instance.get_df()[variable_name].nunique()
+                    self.data_instance.one_hot_encode(variable_name,
+                                                      sparse=n_categories > SPARSE_ONE_HOT_MIN_CATEGORIES)
 
             self.display_data_in_table(self.data_instance.get_df())  # Odśwież tabelę, aby pokazać przetworzone dane
             # Teraz przekazujemy liczbę komponentów jako argument do metody otwierającej dialog PCA